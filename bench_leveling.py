@@ -0,0 +1,49 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import timeit
+from unittest import mock
+
+from features import leveling
+
+# Count the database backed lookups instead of running them, this measures the level math on its own
+lookups = {'multiplier': 0, 'xp_per_level': 0}
+
+
+def fake_multiplier(guild_id: int):
+    lookups['multiplier'] += 1
+    return 2
+
+
+def fake_get_setting(guild_id: int, key: str, default):
+    lookups['xp_per_level'] += 1
+    return '500'
+
+
+with mock.patch.object(leveling, 'db_calculate_multiplier', fake_multiplier), \
+        mock.patch.object(leveling, 'get_setting', fake_get_setting):
+    for level in [1, 10, 80, 1000, 100000]:
+        xp = leveling.get_xp_for_level(0, level)
+        assert leveling.get_level_for_xp(0, xp) == level
+        assert leveling.get_level_for_xp(0, xp - 1) == level - 1
+
+        lookups['multiplier'] = lookups['xp_per_level'] = 0
+        leveling.get_level_for_xp(0, xp)
+        calls = dict(lookups)
+
+        seconds = timeit.timeit(lambda: leveling.get_level_for_xp(0, xp), number=10000)
+        print(f"level={level}: {seconds / 10000 * 1e6:.2f} us per call, lookups per call: {calls}")
@@ -15,9 +15,10 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 
 from utils.config import get_key
+from utils.db_indexes import UnindexedQueryReporter
 
 name = get_key("DB_Username", "")
 password = get_key("DB_Password", "")
@@ -25,4 +26,14 @@ host = get_key("DB_Host", "localhost")
 port = get_key("DB_Port", "27017")
 db = get_key("DB_Database", "akabot")
 
-client = MongoClient(f'mongodb://{name}:{password}@{host}:{port}/', 27017)[db]
+uri = f'mongodb://{name}:{password}@{host}:{port}/'
+
+event_listeners = []
+if get_key("DB_ReportUnindexedQueries", "false") == "true":
+    event_listeners.append(UnindexedQueryReporter())
+
+# Blocking client, kept for code that has not been migrated to async_client yet
+client = MongoClient(uri, 27017, event_listeners=event_listeners)[db]
+
+# Non-blocking client, use this one from async listeners, commands and tasks
+async_client = AsyncMongoClient(uri, 27017, event_listeners=event_listeners)[db]
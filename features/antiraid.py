@@ -15,38 +15,184 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import asyncio
+import datetime
 import time
+from collections import deque
 
 import discord
 import sentry_sdk
 from discord.ext import commands as commands_ext
 
 from utils.analytics import analytics
+from utils.config import get_key
+from utils.generic import pretty_time_delta
 from utils.languages import get_translation_for_key_localized as trl
 from utils.logging_util import log_into_logs
 from utils.settings import get_setting, set_setting
 
 
 class ViolationCounters:
-    past_actions = []
+    """Sliding window counters of recent actions, kept separately for every (guild, user, action)"""
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self) -> None:
+        self.windows = {}  # (GuildID, UserID, action) -> deque of expiry times, oldest first
+        self.last_sweep = time.time()
 
     def add_action(self, action: str, user: discord.Member, expires: int):
+        self._add((user.guild.id, user.id, action), expires)
+
+    def add_guild_action(self, action: str, guild: discord.Guild, expires: int):
+        self._add((guild.id, None, action), expires)
+
+    def count_actions(self, action: str, user: discord.Member):
+        return self._count((user.guild.id, user.id, action))
+
+    def count_guild_actions(self, action: str, guild: discord.Guild):
+        return self._count((guild.id, None, action))
+
+    def _add(self, key: tuple, expires: int):
         if expires < 0:
             raise ValueError('expires must be greater than 0')
 
-        # print("Appending action to past actions")
-        self.past_actions.append({'action': action, 'user': user.id, 'expires': expires + time.time()})
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = deque()
+
+        window.append(expires + time.time())
 
     def filter_expired_actions(self):
-        actions_before = len(self.past_actions)
-        self.past_actions = [action for action in self.past_actions if action['expires'] > time.time()]
-        # print(f"Filtered {actions_before - len(self.past_actions)} expired actions")
+        """Drop the windows of users that haven't done anything recently, runs at most every SWEEP_INTERVAL"""
+        now = time.time()
+        if now - self.last_sweep < self.SWEEP_INTERVAL:
+            return
 
-    def count_actions(self, action: str, user: discord.Member):
+        self.last_sweep = now
+        for key in [key for key, window in self.windows.items() if window[-1] <= now]:
+            del self.windows[key]
+
+    def _count(self, key: tuple):
         self.filter_expired_actions()
-        actions = len([a for a in self.past_actions if a['action'] == action and a['user'] == user.id])
-        # print(f"Counted {actions} actions")
-        return actions
+
+        window = self.windows.get(key)
+        if window is None:
+            return 0
+
+        now = time.time()
+        while window and window[0] <= now:
+            window.popleft()
+
+        if not window:
+            del self.windows[key]
+
+        return len(window)
+
+
+DUPLICATE_INDEX_SIZE = int(get_key("AntiRaid_DuplicateIndexSize", "500"))
+DUPLICATE_MIN_LENGTH = int(get_key("AntiRaid_DuplicateMinLength", "10"))
+
+
+def normalize_content(content: str) -> str:
+    return ' '.join(content.lower().split())
+
+
+class DuplicateContentIndex:
+    """Recent messages of every guild indexed by the hash of their normalized content.
+    Every guild keeps at most `max_size` messages, so the same text posted by many users can be found quickly.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        # GuildID -> (deque of (time, hash, message ID), dict of hash -> {message ID: (channel, user ID)})
+        self.guilds = {}
+        self.windows = {}  # GuildID -> window of the guild's last message, in seconds
+        self.flagged = {}  # (GuildID, hash) -> time until which more copies get deleted right away
+        self.last_sweep = time.time()
+
+    def add(self, message: discord.Message, content_hash: int, window: int) -> list[tuple]:
+        """Add a message to the index
+
+        Args:
+            message (discord.Message): Message
+            content_hash (int): Hash of the normalized content
+            window (int): How many seconds back to keep messages
+
+        Returns:
+            list: (channel, message ID, user ID) of all recent messages with the same content
+        """
+        now = time.time()
+        self.windows[message.guild.id] = window
+        self.sweep(now)
+
+        entries, by_hash = self.guilds.setdefault(message.guild.id, (deque(), {}))
+        entries.append((now, content_hash, message.id))
+        by_hash.setdefault(content_hash, {})[message.id] = (message.channel, message.author.id)
+
+        while entries and (entries[0][0] <= now - window or len(entries) > self.max_size):
+            _, old_hash, old_id = entries.popleft()
+            # The messages of a hash can already be gone by remove
+            same = by_hash.get(old_hash)
+            if same is not None:
+                same.pop(old_id, None)
+                if not same:
+                    del by_hash[old_hash]
+
+        return [(channel, message_id, user_id) for message_id, (channel, user_id) in
+                by_hash.get(content_hash, {}).items()]
+
+    def remove(self, guild_id: int, content_hash: int):
+        """Forget the messages with some content, after they were deleted"""
+        if guild_id in self.guilds:
+            self.guilds[guild_id][1].pop(content_hash, None)
+
+    def is_flagged(self, guild_id: int, content_hash: int) -> bool:
+        return self.flagged.get((guild_id, content_hash), 0) > time.time()
+
+    def flag(self, guild_id: int, content_hash: int, window: int):
+        self.flagged[(guild_id, content_hash)] = time.time() + window
+
+    def sweep(self, now: float):
+        """Drop guilds without messages in their own window and expired flags, runs at most every SWEEP_INTERVAL"""
+        if now - self.last_sweep < self.SWEEP_INTERVAL:
+            return
+
+        self.last_sweep = now
+        for guild_id, (entries, _) in list(self.guilds.items()):
+            if not entries or entries[-1][0] <= now - self.windows[guild_id]:
+                del self.guilds[guild_id]
+                del self.windows[guild_id]
+
+        for key in [k for k, until in self.flagged.items() if until <= now]:
+            del self.flagged[key]
+
+
+RAID_WORKERS = int(get_key("AntiRaid_RaidWorkers", "5"))
+
+
+class RaidMode:
+    """State of a guild while joins are above the join threshold.
+    Joining members are queued and handled by a fixed number of workers.
+    """
+
+    def __init__(self, guild: discord.Guild, action: str, timeout_minutes: int, quiet_time: int) -> None:
+        self.guild = guild
+        self.action = action
+        self.timeout_minutes = timeout_minutes
+        self.quiet_time = quiet_time  # Raid mode ends after this many seconds without joins
+        self.queue = asyncio.Queue()
+        self.started = time.time()
+        self.last_join = time.time()
+        self.handled = 0
+        self.failed = 0
+        self.task = None
+
+    def add_member(self, member: discord.Member):
+        self.last_join = time.time()
+        self.queue.put_nowait(member)
 
 
 class AntiRaid(discord.Cog):
@@ -56,29 +202,89 @@ class AntiRaid(discord.Cog):
         self.join_violation_counters = ViolationCounters()
         self.message_violation_counters = ViolationCounters()
         self.message_send_violation_counters = ViolationCounters()  # This one will be to avoid spamming messages
+        self.raids = {}  # GuildID -> RaidMode
+        self.duplicate_index = DuplicateContentIndex(DUPLICATE_INDEX_SIZE)
 
     @discord.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         try:
-            self.join_violation_counters.filter_expired_actions()
+            raid = self.raids.get(member.guild.id)
+            if raid is not None:
+                raid.add_member(member)
+                return
 
             antiraid_join_threshold = get_setting(member.guild.id, "antiraid_join_threshold", "5")
             antiraid_join_threshold_per = get_setting(member.guild.id, "antiraid_join_threshold_per", "60")
 
-            if self.join_violation_counters.count_actions('join', member) > int(antiraid_join_threshold):
-                if not member.guild.me.guild_permissions.kick_members:
-                    return  # TODO: Send a warning if possible
-
-                if member.can_send():
-                    await member.send(
-                        content=trl(member.id, member.guild.id, "antiraid_kicked_message"))
-                await member.kick(reason=trl(0, member.guild.id, "antiraid_kicked_audit"))
+            self.join_violation_counters.add_guild_action('join', member.guild, int(antiraid_join_threshold_per))
+            if self.join_violation_counters.count_guild_actions('join', member.guild) <= int(antiraid_join_threshold):
                 return
 
-            self.join_violation_counters.add_action('join', member, int(antiraid_join_threshold_per))
+            action = get_setting(member.guild.id, "antiraid_raid_action", "kick")
+            if action == "timeout" and not member.guild.me.guild_permissions.moderate_members:
+                return  # TODO: Send a warning if possible
+
+            if action == "kick" and not member.guild.me.guild_permissions.kick_members:
+                return  # TODO: Send a warning if possible
+
+            raid = RaidMode(member.guild, action, int(get_setting(member.guild.id, "antiraid_raid_timeout", "60")),
+                            int(antiraid_join_threshold_per))
+            self.raids[member.guild.id] = raid
+            raid.add_member(member)
+            raid.task = asyncio.create_task(self.run_raid_mode(raid))
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+    async def run_raid_mode(self, raid: RaidMode):
+        workers = [asyncio.create_task(self.raid_worker(raid)) for _ in range(RAID_WORKERS)]
+        try:
+            while True:
+                await raid.queue.join()
+                quiet = time.time() - raid.last_join
+                if quiet >= raid.quiet_time:
+                    break
+
+                await asyncio.sleep(raid.quiet_time - quiet)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            del self.raids[raid.guild.id]
+
+        try:
+            # One log entry for the whole raid
+            logging_embed = discord.Embed(title=trl(0, raid.guild.id, "antiraid_raid_log_title"))
+            logging_embed.add_field(name=trl(0, raid.guild.id, "antiraid_raid_log_action"), value=raid.action)
+            logging_embed.add_field(name=trl(0, raid.guild.id, "antiraid_raid_log_members"), value=str(raid.handled))
+            logging_embed.add_field(name=trl(0, raid.guild.id, "antiraid_raid_log_failed"), value=str(raid.failed))
+            logging_embed.add_field(name=trl(0, raid.guild.id, "antiraid_raid_log_duration"),
+                                    value=pretty_time_delta(raid.last_join - raid.started, user_id=0,
+                                                            server_id=raid.guild.id))
+            await log_into_logs(raid.guild, logging_embed)
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
+    async def raid_worker(self, raid: RaidMode):
+        while True:
+            member = await raid.queue.get()
+            try:
+                if raid.action == "timeout":
+                    await member.timeout_for(datetime.timedelta(minutes=raid.timeout_minutes),
+                                             reason=trl(0, member.guild.id, "antiraid_kicked_audit"))
+                else:
+                    if member.can_send():
+                        await member.send(content=trl(member.id, member.guild.id, "antiraid_kicked_message"))
+                    await member.kick(reason=trl(0, member.guild.id, "antiraid_kicked_audit"))
+
+                raid.handled += 1
+            except Exception as e:
+                raid.failed += 1
+                sentry_sdk.capture_exception(e)
+            finally:
+                raid.queue.task_done()
+
     antiraid_subcommand = discord.SlashCommandGroup(name='antiraid', description='Manage the antiraid settings')
 
     @discord.Cog.listener()
@@ -90,6 +296,10 @@ class AntiRaid(discord.Cog):
             if message.author.guild_permissions.manage_messages:
                 return
 
+            if get_setting(message.guild.id, "antiraid_duplicate_enabled", "False") == "True":
+                if await self.check_duplicate_content(message):
+                    return
+
             self.message_violation_counters.filter_expired_actions()
 
             antiraid_message_threshold = get_setting(message.guild.id, "antiraid_message_threshold", "5")
@@ -112,6 +322,67 @@ class AntiRaid(discord.Cog):
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
+    async def check_duplicate_content(self, message: discord.Message) -> bool:
+        """Check if the message is part of the same text being posted by many users
+
+        Args:
+            message (discord.Message): Message
+
+        Returns:
+            bool: True if the message was deleted
+        """
+        content = normalize_content(message.content)
+        if len(content) < DUPLICATE_MIN_LENGTH or not message.guild.me.guild_permissions.manage_messages:
+            return False
+
+        content_hash = hash(content)
+        window = int(get_setting(message.guild.id, "antiraid_duplicate_seconds", "30"))
+
+        if self.duplicate_index.is_flagged(message.guild.id, content_hash):
+            try:
+                await message.delete()
+            except discord.NotFound:
+                pass
+            return True
+
+        same = self.duplicate_index.add(message, content_hash, window)
+        if len(same) < int(get_setting(message.guild.id, "antiraid_duplicate_messages", "5")):
+            return False
+
+        users = {user_id for _, _, user_id in same}
+        if len(users) < int(get_setting(message.guild.id, "antiraid_duplicate_users", "3")):
+            return False
+
+        # Copies posted after this get deleted right away until the window passes
+        self.duplicate_index.flag(message.guild.id, content_hash, window)
+
+        by_channel = {}
+        for channel, message_id, _ in same:
+            by_channel.setdefault(channel, []).append(discord.Object(id=message_id))
+
+        for channel, messages in by_channel.items():
+            for i in range(0, len(messages), 100):
+                try:
+                    await channel.delete_messages(messages[i:i + 100],
+                                                  reason=trl(0, message.guild.id, "antiraid_duplicate_audit"))
+                except discord.NotFound:
+                    # A single message is deleted on its own, it may already be gone (spam check, a moderator)
+                    pass
+                except discord.HTTPException as e:
+                    sentry_sdk.capture_exception(e)
+
+        self.duplicate_index.remove(message.guild.id, content_hash)
+
+        logging_embed = discord.Embed(title=trl(0, message.guild.id, "antiraid_duplicate_log_title"))
+        logging_embed.add_field(name=trl(0, message.guild.id, "antiraid_duplicate_log_messages"), value=str(len(same)))
+        logging_embed.add_field(name=trl(0, message.guild.id, "antiraid_duplicate_log_users"),
+                                value=', '.join(f'<@{user_id}>' for user_id in users)[:1024])
+        logging_embed.add_field(name=trl(0, message.guild.id, "antiraid_duplicate_log_content"),
+                                value=message.content[:1024], inline=False)
+        await log_into_logs(message.guild, logging_embed)
+
+        return True
+
     @antiraid_subcommand.command(name="join_threshold", description="Set the join threshold for the antiraid system")
     @discord.default_permissions(manage_guild=True)
     @commands_ext.has_permissions(manage_guild=True)
@@ -187,6 +458,90 @@ class AntiRaid(discord.Cog):
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
+    @antiraid_subcommand.command(name="raid_action",
+                                 description="Set what happens to members joining while the join threshold is exceeded")
+    @discord.default_permissions(manage_guild=True)
+    @commands_ext.has_permissions(manage_guild=True)
+    @commands_ext.guild_only()
+    @discord.option(name='action', description='Kick or time out the joining members', choices=["kick", "timeout"])
+    @discord.option(name='timeout_minutes', description='How long the timeout lasts', type=int, min_value=1,
+                    max_value=40320)
+    @analytics("antiraid raid action")
+    async def set_raid_action(self, ctx: discord.ApplicationContext, action: str, timeout_minutes: int = 60):
+        try:
+            # Get old settings
+            old_action = get_setting(ctx.guild.id, "antiraid_raid_action", "kick")
+
+            # Set new settings
+            set_setting(ctx.guild.id, 'antiraid_raid_action', action)
+            set_setting(ctx.guild.id, 'antiraid_raid_timeout', str(timeout_minutes))
+
+            # Create logging embed
+            logging_embed = discord.Embed(title=trl(0, ctx.guild.id, "logging_antiraid_raid_action_changed"))
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "antiraid_raid_log_action"),
+                                    value=f"{old_action} -> {action}", inline=True)
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "logging_user"),
+                                    value=f"{ctx.user.mention}", inline=False)
+
+            # Send log into logs
+            await log_into_logs(ctx.guild, logging_embed)
+
+            # Send response to user
+            await ctx.respond(
+                trl(ctx.user.id, ctx.guild.id, "antiraid_raid_action_changed", append_tip=True).format(action=action),
+                ephemeral=True)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+    @antiraid_subcommand.command(name="duplicate_spam",
+                                 description="Delete the same message when it's posted by many users at once")
+    @discord.default_permissions(manage_guild=True)
+    @commands_ext.has_permissions(manage_guild=True)
+    @commands_ext.guild_only()
+    @discord.option(name='enabled', description='Whether duplicate spam detection is enabled', type=bool)
+    @discord.option(name='messages', description='The number of identical messages...', type=int, min_value=2)
+    @discord.option(name='users', description='...from this many different users...', type=int, min_value=1)
+    @discord.option(name='per', description='...per the number of seconds to check', type=int, min_value=1,
+                    max_value=3600)
+    @analytics("antiraid duplicate spam")
+    async def set_duplicate_spam(self, ctx: discord.ApplicationContext, enabled: bool, messages: int = 5,
+                                 users: int = 3, per: int = 30):
+        try:
+            # Get old settings
+            old_enabled = get_setting(ctx.guild.id, "antiraid_duplicate_enabled", "False")
+
+            # Set new settings
+            set_setting(ctx.guild.id, 'antiraid_duplicate_enabled', str(enabled))
+            set_setting(ctx.guild.id, 'antiraid_duplicate_messages', str(messages))
+            set_setting(ctx.guild.id, 'antiraid_duplicate_users', str(users))
+            set_setting(ctx.guild.id, 'antiraid_duplicate_seconds', str(per))
+
+            # Create logging embed
+            logging_embed = discord.Embed(title=trl(0, ctx.guild.id, "logging_antiraid_duplicate_changed"))
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "antiraid_duplicate_log_enabled"),
+                                    value=f"{old_enabled} -> {str(enabled)}", inline=True)
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "antiraid_duplicate_log_messages"),
+                                    value=str(messages), inline=True)
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "antiraid_duplicate_log_users"),
+                                    value=str(users), inline=True)
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "logging_per"), value=str(per), inline=True)
+            logging_embed.add_field(name=trl(0, ctx.guild.id, "logging_user"),
+                                    value=f"{ctx.user.mention}", inline=False)
+
+            # Send log into logs
+            await log_into_logs(ctx.guild, logging_embed)
+
+            # Send response to user
+            if enabled:
+                response = trl(ctx.user.id, ctx.guild.id, "antiraid_duplicate_enabled", append_tip=True).format(
+                    messages=str(messages), users=str(users), per=str(per))
+            else:
+                response = trl(ctx.user.id, ctx.guild.id, "antiraid_duplicate_disabled", append_tip=True)
+
+            await ctx.respond(response, ephemeral=True)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
     @antiraid_subcommand.command(name="list", description="List the antiraid settings")
     @discord.default_permissions(manage_guild=True)
     @commands_ext.has_permissions(manage_guild=True)
@@ -16,58 +16,92 @@
 #
 
 import datetime
+import time
+from collections import OrderedDict
 
 import discord
 import sentry_sdk
 from bson import ObjectId
 from discord.ext import commands as discord_commands_ext
+from pymongo import ASCENDING
 
-from database import client
+from database import async_client
 from utils.analytics import analytics
+from utils.cache import TTLCache
 from utils.config import get_key
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 from utils.warning import add_warning
 
+declare_index('AutomodActions', [('GuildID', ASCENDING)])
 
-def db_add_automod_action(guild_id: int, rule_id: int, rule_name: str, action: str, additional) -> ObjectId:
-    insert_result = client['AutomodActions'].insert_one(
+
+AUTOMOD_ACTIONS_CACHE_SIZE = int(get_key("AutomodActions_CacheSize", "10000"))
+AUTOMOD_ACTIONS_CACHE_TTL = int(get_key("AutomodActions_CacheTTL", "3600"))
+
+# GuildID -> {RuleID -> actions}, invalidated when an action is added or removed
+rule_actions_cache = TTLCache(AUTOMOD_ACTIONS_CACHE_SIZE, AUTOMOD_ACTIONS_CACHE_TTL)
+
+
+async def db_add_automod_action(guild_id: int, rule_id: int, rule_name: str, action: str, additional) -> ObjectId:
+    insert_result = await async_client['AutomodActions'].insert_one(
         {'GuildID': str(guild_id), 'RuleID': str(rule_id), 'RuleName': rule_name, 'Action': action,
          'Additional': additional})
+    rule_actions_cache.invalidate(str(guild_id))
 
     return insert_result.inserted_id
 
 
-def db_remove_automod_action(action_id: ObjectId):
-    client['AutomodActions'].delete_one({'_id': action_id})
+async def db_remove_automod_action(guild_id: int, action_id: ObjectId):
+    await async_client['AutomodActions'].delete_one({'_id': action_id, 'GuildID': str(guild_id)})
+    rule_actions_cache.invalidate(str(guild_id))
 
 
-def db_get_automod_actions(guild_id: int):
-    result = client['AutomodActions'].find({'GuildID': str(guild_id)}).to_list()
+async def db_get_automod_actions(guild_id: int):
+    result = await async_client['AutomodActions'].find({'GuildID': str(guild_id)}).to_list()
     return [(str(i['_id']), i['RuleID'], i['RuleName'], i['Action'], i['Additional']) for i in result]
 
 
+async def get_automod_actions_for_rule(guild_id: int, rule_id: int) -> list[tuple]:
+    """Get the actions of an automod rule, from the per-guild rule index
+
+    Args:
+        guild_id (int): Guild ID
+        rule_id (int): Automod rule ID
+
+    Returns:
+        list: Actions in the same format as db_get_automod_actions
+    """
+    index = rule_actions_cache.get(str(guild_id))
+    if index is None:
+        index = {}
+        for action in await db_get_automod_actions(guild_id):
+            index.setdefault(int(action[1]), []).append(action)
+
+        rule_actions_cache.set(str(guild_id), index)
+
+    return index.get(rule_id, [])
+
+
 class AutomodActionsStorage:
-    def __init__(self):
-        self.events = []
+    """Automod triggers handled recently, so one message triggering a rule multiple times is only handled once"""
+
+    def __init__(self, ttl: float = 1):
+        self.ttl = ttl
+        self.events = OrderedDict()  # (rule_id, message_id) -> expiry time, oldest first
 
     def add_event(self, rule_id, message_id):
         self.expire_events()
-        print("Adding event", rule_id, message_id)
-        self.events.append((rule_id, message_id, datetime.datetime.now()))
+        self.events[(rule_id, message_id)] = time.monotonic() + self.ttl
 
     def check_event(self, rule_id, message_id):
         self.expire_events()
-        for event in self.events:
-            if event[0] == rule_id and event[1] == message_id:
-                print("Event already exists", event)
-                return True
-        return False
+        return (rule_id, message_id) in self.events
 
     def expire_events(self):
-        for event in self.events:
-            if event[2] < datetime.datetime.now() - datetime.timedelta(seconds=1):
-                print("Expired event", event)
-                self.events.remove(event)
+        now = time.monotonic()
+        while self.events and next(iter(self.events.values())) < now:
+            self.events.popitem(last=False)
 
 
 class AutomodActions(discord.Cog):
@@ -82,44 +116,41 @@ class AutomodActions(discord.Cog):
                 return
 
             self.storage_1.add_event(payload.rule_id, payload.message_id)
-            automod_actions = db_get_automod_actions(payload.guild_id)
-            for automod_action in automod_actions:
-                if int(automod_action[1]) == payload.rule_id:
-
-                    extra = str(automod_action[4])
-
-                    extra = extra.replace("{keyword}", payload.matched_keyword)
-                    extra = extra.replace("{name}", payload.member.display_name)
-                    extra = extra.replace("{guild}", payload.guild.name)
-
-                    if automod_action[3].startswith("timeout"):
-                        if payload.member.timed_out:
-                            return
-
-                        duration = automod_action[3].split(" ")[1]
-                        if duration == "1h":
-                            duration = datetime.timedelta(hours=1)
-                        elif duration == "12h":
-                            duration = datetime.timedelta(hours=12)
-                        elif duration == "1d":
-                            duration = datetime.timedelta(days=1)
-                        elif duration == "7d":
-                            duration = datetime.timedelta(days=7)
-                        elif duration == "28d":
-                            duration = datetime.timedelta(days=28)
-
-                        await payload.member.timeout_for(duration, reason=extra)
-                    elif automod_action[3] == "ban":
-                        await payload.member.ban(reason=extra)
-                    elif automod_action[3] == "kick":
-                        await payload.member.kick(reason=extra)
-                    elif automod_action[3] == "DM":
-                        try:
-                            await payload.member.send(extra)
-                        except discord.Forbidden:
-                            pass
-                    elif automod_action[3] == "warning":
-                        await add_warning(payload.member, payload.guild, extra)
+            for automod_action in await get_automod_actions_for_rule(payload.guild_id, payload.rule_id):
+                extra = str(automod_action[4])
+
+                extra = extra.replace("{keyword}", payload.matched_keyword)
+                extra = extra.replace("{name}", payload.member.display_name)
+                extra = extra.replace("{guild}", payload.guild.name)
+
+                if automod_action[3].startswith("timeout"):
+                    if payload.member.timed_out:
+                        return
+
+                    duration = automod_action[3].split(" ")[1]
+                    if duration == "1h":
+                        duration = datetime.timedelta(hours=1)
+                    elif duration == "12h":
+                        duration = datetime.timedelta(hours=12)
+                    elif duration == "1d":
+                        duration = datetime.timedelta(days=1)
+                    elif duration == "7d":
+                        duration = datetime.timedelta(days=7)
+                    elif duration == "28d":
+                        duration = datetime.timedelta(days=28)
+
+                    await payload.member.timeout_for(duration, reason=extra)
+                elif automod_action[3] == "ban":
+                    await payload.member.ban(reason=extra)
+                elif automod_action[3] == "kick":
+                    await payload.member.kick(reason=extra)
+                elif automod_action[3] == "DM":
+                    try:
+                        await payload.member.send(extra)
+                    except discord.Forbidden:
+                        pass
+                elif automod_action[3] == "warning":
+                    await add_warning(payload.member, payload.guild, extra)
 
         except Exception as e:
             sentry_sdk.capture_exception(e)
@@ -140,7 +171,7 @@ class AutomodActions(discord.Cog):
                                   message_reason: str = None):
         try:
             # verify count of rules
-            automod_db_actions = db_get_automod_actions(ctx.guild.id)
+            automod_db_actions = await db_get_automod_actions(ctx.guild.id)
             if len(automod_db_actions) >= int(get_key("AutomodActions_MaxActions", "5")):
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "automod_actions_max_reached"), ephemeral=True)
                 return
@@ -178,8 +209,8 @@ class AutomodActions(discord.Cog):
             elif not message_reason:
                 message_reason = trl(0, ctx.guild.id, "automod_default")
 
-            action_id = db_add_automod_action(ctx.guild.id, automod_rule.id, rule_name, action,
-                                              additional=message_reason)
+            action_id = await db_add_automod_action(ctx.guild.id, automod_rule.id, rule_name, action,
+                                                    additional=message_reason)
             await ctx.respond(
                 trl(ctx.user.id, ctx.guild.id, "automod_added", append_tip=True).format(id=str(action_id)),
                 ephemeral=True)
@@ -200,7 +231,7 @@ class AutomodActions(discord.Cog):
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "automod_rule_doesnt_exist_2"), ephemeral=True)
                 return
 
-            automod_actions = db_get_automod_actions(ctx.guild.id)
+            automod_actions = await db_get_automod_actions(ctx.guild.id)
             automod_rule = None
             for rule in automod_actions:
                 if rule[0] == action_id:
@@ -211,7 +242,7 @@ class AutomodActions(discord.Cog):
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "automod_rule_doesnt_exist_2"), ephemeral=True)
                 return
 
-            db_remove_automod_action(ObjectId(action_id))
+            await db_remove_automod_action(ctx.guild.id, ObjectId(action_id))
             await ctx.respond(trl(ctx.user.id, ctx.guild.id, "automod_removed", append_tip=True), ephemeral=True)
         except Exception as e:
             sentry_sdk.capture_exception(e)
@@ -223,7 +254,7 @@ class AutomodActions(discord.Cog):
     @analytics("automod action list")
     async def automod_actions_list(self, ctx: discord.ApplicationContext):
         try:
-            automod_actions = db_get_automod_actions(ctx.guild.id)
+            automod_actions = await db_get_automod_actions(ctx.guild.id)
             if not automod_actions:
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "automod_actions_list_empty", append_tip=True),
                                   ephemeral=True)
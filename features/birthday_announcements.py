@@ -20,13 +20,18 @@ import datetime
 import discord
 import sentry_sdk
 from discord.ext import tasks, commands
+from pymongo import ASCENDING
 
 from database import client
 from utils.analytics import analytics
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 from utils.per_user_settings import get_per_user_setting
 from utils.settings import set_setting
 
+declare_index('UserBirthday', [('UserID', ASCENDING)], unique=True)
+declare_index('UserBirthday', [('Birth.Month', ASCENDING), ('Birth.Day', ASCENDING)])
+
 
 class BirthdayAnnouncements(discord.Cog):
     def __init__(self, bot: discord.Bot):
@@ -15,65 +15,231 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import asyncio
+import atexit
+import heapq
 import time
 
 import discord
 import sentry_sdk
 from discord.ext import commands as commands_ext
 from discord.ext import tasks
+from pymongo import ASCENDING, UpdateOne
 
-from database import client
+from database import client, async_client
 from utils.analytics import analytics
+from utils.config import get_key
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 from utils.logging_util import log_into_logs
 
+declare_index('ChatRevive', [('GuildID', ASCENDING), ('ChannelID', ASCENDING)], unique=True)
+
+CHAT_REVIVE_WRITE_INTERVAL = int(get_key("ChatRevive_WriteInterval", "60"))
+
+# (GuildID, ChannelID) -> ChatRevive document, the in-memory copy is the one kept up to date
+revive_configs = {}
+# (GuildID, ChannelID) of the channels whose LastMessage hasn't been written yet
+dirty_revive_channels = set()
+# (deadline, GuildID, ChannelID), entries that no longer match the config are skipped or pushed back when popped
+revive_deadlines = []
+revive_wakeup = asyncio.Event()
+
+
+def schedule_revive(guild_id: str, channel_id: str, deadline: float = None):
+    config = revive_configs[(guild_id, channel_id)]
+    if deadline is None:
+        deadline = config['LastMessage'] + config['RevivalTime']
+
+    heapq.heappush(revive_deadlines, (deadline, guild_id, channel_id))
+    revive_wakeup.set()
+
+
+def _last_message_operations(batch: list[tuple[str, str]]) -> list[UpdateOne]:
+    return [UpdateOne({'GuildID': guild_id, 'ChannelID': channel_id},
+                      {'$set': {'LastMessage': revive_configs[(guild_id, channel_id)]['LastMessage'],
+                                'Revived': revive_configs[(guild_id, channel_id)]['Revived']}})
+            for guild_id, channel_id in batch if (guild_id, channel_id) in revive_configs]
+
+
+async def flush_last_messages():
+    """Write the LastMessage of every channel that got messages since the last flush"""
+    if not dirty_revive_channels:
+        return
+
+    batch = list(dirty_revive_channels)
+    dirty_revive_channels.clear()
+    operations = _last_message_operations(batch)
+    if not operations:
+        return
+
+    try:
+        await async_client['ChatRevive'].bulk_write(operations, ordered=False)
+    except Exception:
+        dirty_revive_channels.update(batch)
+        raise
+
+
+def flush_last_messages_sync():
+    """Same as flush_last_messages, for shutdown when the event loop is no longer running"""
+    if not dirty_revive_channels:
+        return
+
+    batch = list(dirty_revive_channels)
+    dirty_revive_channels.clear()
+    operations = _last_message_operations(batch)
+    if not operations:
+        return
+
+    try:
+        client['ChatRevive'].bulk_write(operations, ordered=False)
+    except Exception as e:
+        dirty_revive_channels.update(batch)
+        sentry_sdk.capture_exception(e)
+
+
+atexit.register(flush_last_messages_sync)
+
+
+async def add_revive_configs(guild_ids: list[int]):
+    """Load the revive configs of guilds into memory and schedule their channels
+
+    Args:
+        guild_ids (list[int]): Guild IDs
+    """
+    async for i in async_client['ChatRevive'].find({'GuildID': {'$in': [str(guild_id) for guild_id in guild_ids]}}):
+        revive_configs[(i['GuildID'], i['ChannelID'])] = i
+        if not i['Revived']:
+            schedule_revive(i['GuildID'], i['ChannelID'])
+
+
+async def load_revive_configs(guild_ids: list[int]):
+    """Replace the in-memory revive configs with the ones of the guilds the bot is in
+
+    Args:
+        guild_ids (list[int]): Guild IDs
+    """
+    # LastMessage values that weren't written yet would be lost when the configs are replaced
+    await flush_last_messages()
+    revive_configs.clear()
+    revive_deadlines.clear()
+    await add_revive_configs(guild_ids)
+
 
 class ChatRevive(discord.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
+        self.loaded = False
 
     @discord.Cog.listener()
     async def on_ready(self):
-        self.revive_channels.start()
+        # on_ready also fires on every reconnect, the in-memory configs are kept up to date from there on
+        if not self.loaded:
+            try:
+                await load_revive_configs([guild.id for guild in self.bot.guilds])
+                self.loaded = True
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+
+        if not self.revive_channels.is_running():
+            self.revive_channels.start()
+
+        if not self.flush_revive_channels.is_running():
+            self.flush_revive_channels.start()
+
+    @discord.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        try:
+            await add_revive_configs([guild.id])
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+    def cog_unload(self) -> None:
+        self.flush_revive_channels.cancel()
+        flush_last_messages_sync()
+
+    @tasks.loop(seconds=CHAT_REVIVE_WRITE_INTERVAL)
+    async def flush_revive_channels(self):
+        try:
+            await flush_last_messages()
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
 
     @discord.Cog.listener()
     async def on_message(self, message: discord.Message):
         try:
-            if message.author.bot:
+            if message.author.bot or message.guild is None:
+                return
+
+            key = (str(message.guild.id), str(message.channel.id))
+            config = revive_configs.get(key)
+            if config is None:
                 return
 
-            client['ChatRevive'].update_one({'GuildID': str(message.guild.id), 'ChannelID': str(message.channel.id)},
-                                            {'$set': {'LastMessage': time.time(), 'Revived': False}})
+            # Moving LastMessage pushes the deadline forward, the engine reschedules when it pops the old one
+            config['LastMessage'] = time.time()
+            dirty_revive_channels.add(key)
+            if config['Revived']:
+                config['Revived'] = False
+                schedule_revive(*key)
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
-    @tasks.loop(minutes=1)
+    @tasks.loop()
     async def revive_channels(self):
         try:
-            for guild in self.bot.guilds:
-                data = client['ChatRevive'].find({'GuildID': str(guild.id)}).to_list()
-                for revive_channel in data:
-                    if revive_channel['Revived']:
-                        continue
-
-                    if time.time() - revive_channel['LastMessage'] > revive_channel['RevivalTime']:
-                        role = guild.get_role(int(revive_channel['RoleID']))
-                        if role is None:
-                            continue
-
-                        channel = guild.get_channel(int(revive_channel['ChannelID']))
-                        if channel is None:
-                            continue
-
-                        if not channel.can_send():
-                            continue
-
-                        await channel.send(f'{role.mention}, this channel has been inactive for a while.')
-                        client['ChatRevive'].update_one({'GuildID': str(guild.id), 'ChannelID': str(channel.id)},
-                                                        {'$set': {'Revived': True}})
+            timeout = revive_deadlines[0][0] - time.time() if revive_deadlines else None
+            revive_wakeup.clear()
+            try:
+                await asyncio.wait_for(revive_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            now = time.time()
+            while revive_deadlines and revive_deadlines[0][0] <= now:
+                _, guild_id, channel_id = heapq.heappop(revive_deadlines)
+                config = revive_configs.get((guild_id, channel_id))
+                if config is None or config['Revived']:
+                    continue
+
+                if config['LastMessage'] + config['RevivalTime'] > now:
+                    schedule_revive(guild_id, channel_id)
+                    continue
+
+                try:
+                    await self.revive_channel(config)
+                except Exception as e:
+                    sentry_sdk.capture_exception(e)
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
+    async def revive_channel(self, revive_channel: dict):
+        guild = self.bot.get_guild(int(revive_channel['GuildID']))
+        if guild is None:
+            # The bot left the guild, its configs are loaded again if it's added back
+            revive_configs.pop((revive_channel['GuildID'], revive_channel['ChannelID']), None)
+            return
+
+        role = guild.get_role(int(revive_channel['RoleID']))
+        channel = guild.get_channel(int(revive_channel['ChannelID']))
+        if role is None or channel is None or not channel.can_send():
+            # Try again in a minute
+            schedule_revive(revive_channel['GuildID'], revive_channel['ChannelID'], time.time() + 60)
+            return
+
+        revive_channel['Revived'] = True
+        try:
+            await channel.send(f'{role.mention}, this channel has been inactive for a while.')
+        except Exception:
+            revive_channel['Revived'] = False
+            schedule_revive(revive_channel['GuildID'], revive_channel['ChannelID'], time.time() + 60)
+            raise
+
+        await async_client['ChatRevive'].update_one({'GuildID': str(guild.id), 'ChannelID': str(channel.id)},
+                                                    {'$set': {'LastMessage': revive_channel['LastMessage'],
+                                                              'Revived': True}})
+        dirty_revive_channels.discard((str(guild.id), str(channel.id)))
+
     chat_revive_subcommand = discord.SlashCommandGroup(name='chatrevive', description='Revive channels')
 
     @chat_revive_subcommand.command(name="set", description="Set revive settings for a channel")
@@ -96,13 +262,14 @@ class ChatRevive(discord.Cog):
             # Database access
 
             # Delete existing record
-            client['ChatRevive'].delete_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)})
+            await async_client['ChatRevive'].delete_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)})
 
             # Set new one
-            client['ChatRevive'].insert_one(
-                {'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id), 'RoleID': str(revival_role.id),
-                 'RevivalTime': revival_minutes * 60, 'LastMessage': time.time(),
-                 'Revived': False})
+            config = {'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id), 'RoleID': str(revival_role.id),
+                      'RevivalTime': revival_minutes * 60, 'LastMessage': time.time(), 'Revived': False}
+            await async_client['ChatRevive'].insert_one(config)
+            revive_configs[(str(ctx.guild.id), str(channel.id))] = config
+            schedule_revive(str(ctx.guild.id), str(channel.id))
 
             # Embed for logs
             logging_embed = discord.Embed(title=trl(ctx.user.id, ctx.guild.id, "chat_revive_log_set_title"))
@@ -135,7 +302,8 @@ class ChatRevive(discord.Cog):
     @analytics("chatrevive remove")
     async def remove_revive_settings(self, ctx: discord.ApplicationContext, channel: discord.TextChannel):
         try:
-            client['ChatRevive'].delete_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)})
+            await async_client['ChatRevive'].delete_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)})
+            revive_configs.pop((str(ctx.guild.id), str(channel.id)), None)
 
             # Create embed
             logging_embed = discord.Embed(title=trl(ctx.user.id, ctx.guild.id, "chat_revive_remove_log_title"))
@@ -162,7 +330,8 @@ class ChatRevive(discord.Cog):
     @analytics("chatrevive list")
     async def list_revive_settings(self, ctx: discord.ApplicationContext, channel: discord.TextChannel):
         try:
-            result = client['ChatRevive'].find_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)})
+            result = await async_client['ChatRevive'].find_one(
+                {'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)})
 
             if not result:
                 await ctx.respond(
@@ -19,10 +19,14 @@ import datetime
 
 import discord
 import sentry_sdk
-from discord.ext import commands as commands_ext, pages
+from discord.ext import commands as commands_ext, pages, tasks
+from pymongo import ASCENDING, DESCENDING
 
-from database import client
+from database import client, async_client
 from utils.analytics import analytics
+from utils.cache import TTLCache
+from utils.config import get_key
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl, get_language
 from utils.logging_util import log_into_logs
 from utils.per_user_settings import get_per_user_setting
@@ -30,6 +34,17 @@ from utils.settings import get_setting, set_setting
 from utils.tips import append_tip_to_message
 from utils.tzutil import get_server_midnight_time
 
+declare_index('ChatStreaks', [('GuildID', ASCENDING), ('MemberID', ASCENDING)], unique=True)
+declare_index('ChatStreaks', [('GuildID', ASCENDING), ('Streak', DESCENDING)])
+
+STREAK_CACHE_SIZE = int(get_key("ChatStreaks_CacheSize", "100000"))
+STREAK_CACHE_TTL = int(get_key("ChatStreaks_CacheTTL", "3600"))
+STREAK_LEADERBOARD_SIZE = int(get_key("ChatStreaks_LeaderboardSize", "100"))
+STREAK_EXPIRY = datetime.timedelta(days=1, hours=1)
+
+# (GuildID, MemberID) -> (LastMessage, StartTime) as stored in the database, the bot is the only writer
+streak_states = TTLCache(STREAK_CACHE_SIZE, STREAK_CACHE_TTL)
+
 
 class ChatStreakStorage:
     """Chat Streaks Storage.
@@ -51,33 +66,44 @@ class ChatStreakStorage:
             str: The state of the streak
         """
 
-        res = client['ChatStreaks'].find_one({'GuildID': str(guild_id), 'MemberID': str(member_id)})
+        key = (str(guild_id), str(member_id))
+        midnight = get_server_midnight_time(guild_id)
+        state = streak_states.get(key)
+
+        if state is None:
+            res = client['ChatStreaks'].find_one({'GuildID': str(guild_id), 'MemberID': str(member_id)})
+
+            if not res:
+                client['ChatStreaks'].insert_one(
+                    {'GuildID': str(guild_id), 'MemberID': str(member_id), 'LastMessage': midnight,
+                     'StartTime': midnight, 'Streak': 0})
+                streak_states.set(key, (midnight, midnight))
 
-        if not res:
-            start_time = get_server_midnight_time(guild_id)
-            client['ChatStreaks'].insert_one(
-                {'GuildID': str(guild_id), 'MemberID': str(member_id), 'LastMessage': start_time,
-                 'StartTime': start_time})
+                return "started", 0, 0
 
-            return "started", 0, 0
+            state = (res['LastMessage'], res['StartTime'])
+            streak_states.set(key, state)
 
-        last_message = res['LastMessage']
-        start_time = res['StartTime']
+        last_message, start_time = state
+
+        # Already credited today, nothing to write
+        if last_message >= midnight:
+            return "stayed", (last_message - start_time).days, 0
 
         # Check for streak expiry
-        if get_server_midnight_time(guild_id) - last_message > datetime.timedelta(days=1, hours=1):
+        if midnight - last_message > STREAK_EXPIRY:
             streak = max((last_message - start_time).days, 0)
-            client['ChatStreaks'].update_one({'GuildID': str(guild_id), 'MemberID': str(member_id)}, {
-                '$set': {'LastMessage': get_server_midnight_time(guild_id),
-                         'StartTime': get_server_midnight_time(guild_id)}})
+            client['ChatStreaks'].update_one({'GuildID': str(guild_id), 'MemberID': str(member_id)},
+                                             {'$set': {'LastMessage': midnight, 'StartTime': midnight, 'Streak': 0}})
+            streak_states.set(key, (midnight, midnight))
             return "expired", streak, 0
 
         before_update = (last_message - start_time).days
+        after_update = (midnight - start_time).days
 
         client['ChatStreaks'].update_one({'GuildID': str(guild_id), 'MemberID': str(member_id)},
-                                         {'$set': {'LastMessage': get_server_midnight_time(guild_id)}})
-
-        after_update = (get_server_midnight_time(guild_id) - start_time).days
+                                         {'$set': {'LastMessage': midnight, 'Streak': after_update}})
+        streak_states.set(key, (midnight, start_time))
 
         if before_update != after_update:
             return "updated", before_update, after_update
@@ -92,14 +118,25 @@ class ChatStreakStorage:
             member_id (int): Member ID
         """
 
-        if client['ChatStreaks'].find_one({'GuildID': str(guild_id), 'MemberID': str(member_id)}) is None:
-            client['ChatStreaks'].insert_one({'GuildID': str(guild_id), 'MemberID': str(member_id),
-                                              'LastMessage': get_server_midnight_time(guild_id),
-                                              'StartTime': get_server_midnight_time(guild_id)})
-        else:
-            client['ChatStreaks'].update_one({'GuildID': str(guild_id), 'MemberID': str(member_id)}, {
-                '$set': {'LastMessage': get_server_midnight_time(guild_id),
-                         'StartTime': get_server_midnight_time(guild_id)}})
+        midnight = get_server_midnight_time(guild_id)
+        client['ChatStreaks'].update_one({'GuildID': str(guild_id), 'MemberID': str(member_id)},
+                                         {'$set': {'LastMessage': midnight, 'StartTime': midnight, 'Streak': 0}},
+                                         upsert=True)
+        streak_states.set((str(guild_id), str(member_id)), (midnight, midnight))
+
+    async def sweep_expired_streaks(self, guild_id: int) -> None:
+        """Zero the stored streak length of every member whose streak has expired.
+        Documents from before the Streak field existed are converted by utils.db_converter on startup.
+
+        Args:
+            guild_id (int): Guild ID
+        """
+
+        # LastMessage and StartTime are kept so the member still gets the expiry message
+        expired_before = get_server_midnight_time(guild_id) - STREAK_EXPIRY
+        await async_client['ChatStreaks'].update_many(
+            {'GuildID': str(guild_id), 'Streak': {'$gt': 0}, 'LastMessage': {'$lt': expired_before}},
+            {'$set': {'Streak': 0}})
 
 
 class ChatStreaks(discord.Cog):
@@ -107,6 +144,25 @@ class ChatStreaks(discord.Cog):
         super().__init__()
         self.bot = bot
         self.streak_storage = ChatStreakStorage()
+        self.swept = {}  # GuildID -> server midnight of the last sweep
+
+    @discord.Cog.listener()
+    async def on_ready(self):
+        if not self.sweep_streaks.is_running():
+            self.sweep_streaks.start()
+
+    @tasks.loop(hours=1)
+    async def sweep_streaks(self):
+        for guild in self.bot.guilds:
+            try:
+                midnight = get_server_midnight_time(guild.id)
+                if self.swept.get(guild.id) == midnight:
+                    continue
+
+                await self.streak_storage.sweep_expired_streaks(guild.id)
+                self.swept[guild.id] = midnight
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
 
     @discord.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -227,19 +283,9 @@ class ChatStreaks(discord.Cog):
     @analytics("streaks leaderboard")
     async def streaks_lb(self, ctx: discord.ApplicationContext):
         try:
-            rows = client['ChatStreaks'].aggregate([
-                {
-                    "$match": {"GuildID": str(ctx.guild.id)}
-                },
-                {
-                    "$addFields": {
-                        "MaxStreak": {"$max": {'$divide': [{"$subtract": ["$LastMessage", "$StartTime"]}, 86400000]}}
-                    }
-                },
-                {
-                    "$sort": {"MaxStreak": -1}
-                }
-            ]).to_list()
+            rows = client['ChatStreaks'].find({'GuildID': str(ctx.guild.id), 'Streak': {'$gt': 0}},
+                                              {'_id': 0, 'MemberID': 1, 'Streak': 1}).sort('Streak', DESCENDING).limit(
+                STREAK_LEADERBOARD_SIZE).to_list()
 
             lb_pages = []
             lb_last = False
@@ -251,7 +297,7 @@ class ChatStreaks(discord.Cog):
                 if member is None:
                     continue
 
-                days = int(row['MaxStreak'])
+                days = row['Streak']
 
                 message += trl(ctx.user.id, ctx.guild.id, "chat_streak_leaderboard_line").format(position=i,
                                                                                                  user=member.mention,
@@ -15,29 +15,292 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import asyncio
+import atexit
 import datetime
+import heapq
+import time
 
 import discord
 import sentry_sdk
 from discord.ext import commands as commands_ext
 from discord.ext import tasks
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 
-from database import client
+from database import client, async_client
 from utils.analytics import analytics
+from utils.config import get_key
+from utils.db_indexes import declare_index
+from utils.heavy_hitters import SpaceSaving
 from utils.languages import get_translation_for_key_localized as trl
 from utils.logging_util import log_into_logs
 from utils.settings import get_setting, set_setting
 from utils.tzutil import get_now_for_server
 
+declare_index('ChatSummary', [('GuildID', ASCENDING), ('ChannelID', ASCENDING)], unique=True)
+declare_index('ChatSummary', [('Enabled', ASCENDING)])
+declare_index('ChatSummaryArchive', [('GuildID', ASCENDING), ('ChannelID', ASCENDING), ('Period', ASCENDING),
+                                      ('Bucket', DESCENDING)], unique=True)
+
+
+CHAT_SUMMARY_FLUSH_INTERVAL = int(get_key("ChatSummary_FlushInterval", "30"))
+CHAT_SUMMARY_TOP_POSTERS_CAPACITY = int(get_key("ChatSummary_TopPostersCapacity", "100"))
+
+# (GuildID, ChannelID) -> today's posters of every channel with chat summary enabled, loaded on startup
+channel_counters = {}
+# (GuildID, ChannelID) of the counters changed since the last flush
+dirty_channels = set()
+
+
+def load_channel_counter(doc: dict) -> SpaceSaving:
+    # Older documents store every poster in an unbounded Messages dict
+    top_posters = doc.get('TopPosters') or {k: [v, 0] for k, v in doc.get('Messages', {}).items()}
+    return SpaceSaving.from_document(CHAT_SUMMARY_TOP_POSTERS_CAPACITY, doc.get('MessageCount', 0), top_posters)
+
+
+def count_message(message: discord.Message):
+    key = (str(message.guild.id), str(message.channel.id))
+    counter = channel_counters.get(key)
+    if counter is None:
+        return
+
+    counter.add(str(message.author.id))
+    dirty_channels.add(key)
+
+
+def _pending_count_operations(batch: list[tuple[str, str]]) -> list[UpdateOne]:
+    return [UpdateOne({'GuildID': guild_id, 'ChannelID': channel_id},
+                      {'$set': {'MessageCount': channel_counters[(guild_id, channel_id)].total,
+                                'TopPosters': channel_counters[(guild_id, channel_id)].to_document()},
+                       '$unset': {'Messages': ''}})
+            for guild_id, channel_id in batch if (guild_id, channel_id) in channel_counters]
+
+
+async def flush_pending_counts():
+    """Write the changed counters to the database, one update per channel"""
+    if not dirty_channels:
+        return
+
+    batch = list(dirty_channels)
+    dirty_channels.clear()
+    operations = _pending_count_operations(batch)
+    if not operations:
+        return
+
+    try:
+        await async_client['ChatSummary'].bulk_write(operations, ordered=False)
+    except Exception:
+        # The counters are written as a whole, retrying on the next flush is enough
+        dirty_channels.update(batch)
+        raise
+
+
+def flush_pending_counts_sync():
+    """Same as flush_pending_counts, for shutdown when the event loop is no longer running"""
+    if not dirty_channels:
+        return
+
+    batch = list(dirty_channels)
+    dirty_channels.clear()
+    operations = _pending_count_operations(batch)
+    if not operations:
+        return
+
+    try:
+        client['ChatSummary'].bulk_write(operations, ordered=False)
+    except Exception as e:
+        dirty_channels.update(batch)
+        sentry_sdk.capture_exception(e)
+
+
+async def load_enabled_channels():
+    # Counts that weren't written yet would be lost when the counters are replaced
+    await flush_pending_counts()
+    channel_counters.clear()
+    async for i in async_client['ChatSummary'].find({'Enabled': True}):
+        channel_counters[(i['GuildID'], i['ChannelID'])] = load_channel_counter(i)
+
+
+atexit.register(flush_pending_counts_sync)
+
+
+def get_archive_buckets(day: datetime.date) -> dict[str, str]:
+    """Get the archive buckets a day belongs to
+
+    Args:
+        day (datetime.date): Day
+
+    Returns:
+        dict: Period -> Bucket
+    """
+    year, week, _ = day.isocalendar()
+    return {'day': day.isoformat(), 'week': f'{year}-W{week:02d}', 'month': day.strftime('%Y-%m')}
+
+
+def get_bucket_days(period: str, day: datetime.date) -> list[str]:
+    """Get every day of the archive bucket a day belongs to
+
+    Args:
+        period (str): week or month
+        day (datetime.date): Day
+
+    Returns:
+        list: Days in ISO format
+    """
+    if period == 'week':
+        first = day - datetime.timedelta(days=day.weekday())
+        return [(first + datetime.timedelta(days=k)).isoformat() for k in range(7)]
+
+    first = day.replace(day=1)
+    days = []
+    while first.month == day.month:
+        days.append(first.isoformat())
+        first += datetime.timedelta(days=1)
+
+    return days
+
+
+async def db_archive_day(guild_id: str, channel_id: str, day: datetime.date, counter: SpaceSaving):
+    """Store the totals of a day and rebuild the week and month buckets from the stored days.
+    Archiving the same day again gives the same result.
+
+    Args:
+        guild_id (str): Guild ID
+        channel_id (str): Channel ID
+        day (datetime.date): The day that's being archived
+        counter (SpaceSaving): The posters of the day
+    """
+    buckets = get_archive_buckets(day)
+    await async_client['ChatSummaryArchive'].update_one(
+        {'GuildID': guild_id, 'ChannelID': channel_id, 'Period': 'day', 'Bucket': buckets['day']},
+        {'$set': {'MessageCount': counter.total, 'TopPosters': counter.to_document()}}, upsert=True)
+
+    operations = []
+    for period in ('week', 'month'):
+        rollup = SpaceSaving(CHAT_SUMMARY_TOP_POSTERS_CAPACITY)
+        async for res in async_client['ChatSummaryArchive'].find(
+                {'GuildID': guild_id, 'ChannelID': channel_id, 'Period': 'day',
+                 'Bucket': {'$in': get_bucket_days(period, day)}}):
+            rollup.merge(SpaceSaving.from_document(CHAT_SUMMARY_TOP_POSTERS_CAPACITY, res['MessageCount'],
+                                                   res['TopPosters']))
+
+        operations.append(UpdateOne({'GuildID': guild_id, 'ChannelID': channel_id, 'Period': period,
+                                     'Bucket': buckets[period]},
+                                    {'$set': {'MessageCount': rollup.total, 'TopPosters': rollup.to_document()}},
+                                    upsert=True))
+
+    await async_client['ChatSummaryArchive'].bulk_write(operations)
+
+
+async def db_get_archive(guild_id: str, channel_id: str, period: str, limit: int) -> list[dict]:
+    return await async_client['ChatSummaryArchive'].find(
+        {'GuildID': guild_id, 'ChannelID': channel_id, 'Period': period}).sort('Bucket', DESCENDING).limit(
+        limit).to_list()
+
+
+def format_summary_date(guild_id: int, date: datetime.date) -> str:
+    """Format a date in the date format the guild chose for chat summaries
+
+    Args:
+        guild_id (int): Guild ID
+        date (datetime.date): Date
+
+    Returns:
+        str: Formatted date
+    """
+    date_format = get_setting(guild_id, "chatsummary_dateformat", "YYYY/MM/DD")
+    day = f"{date.day:02}"
+    month = f"{date.month:02}"
+
+    if date_format == "DD/MM/YYYY":
+        return f"{day}/{month}/{date.year}"
+    elif date_format == "DD. MM. YYYY":
+        return f"{day}. {month}. {date.year}"
+    elif date_format == "YYYY/DD/MM":
+        return f"{date.year}/{day}/{month}"
+    elif date_format == "MM/DD/YYYY":
+        return f"{month}/{day}/{date.year}"
+    elif date_format == "YYYY年MM月DD日":
+        return f"{date.year}年{month}月{day}日"
+    else:
+        return f"{date.year}/{month}/{day}"
+
+
+def get_next_midnight(guild_id: int) -> float:
+    """Get the time.time() timestamp of the next midnight in the server's timezone"""
+    now = get_now_for_server(guild_id)
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return time.time() + (midnight - now).total_seconds() + 1
+
+
+class MidnightScheduler:
+    """Keeps the next local midnight of every guild in a heap, so only the earliest one has to be waited for"""
+
+    def __init__(self) -> None:
+        self.heap = []  # (deadline, GuildID)
+        self.deadlines = {}  # GuildID -> deadline, heap entries that don't match are stale
+        self.changed = asyncio.Event()
+
+    def schedule(self, guild_id: str) -> None:
+        if guild_id in self.deadlines:
+            return
+
+        deadline = get_next_midnight(int(guild_id))
+        self.deadlines[guild_id] = deadline
+        heapq.heappush(self.heap, (deadline, guild_id))
+        self.changed.set()
+
+    def pop_due(self) -> list[str]:
+        due = []
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            deadline, guild_id = heapq.heappop(self.heap)
+            if self.deadlines.get(guild_id) == deadline:
+                del self.deadlines[guild_id]
+                due.append(guild_id)
+
+        return due
+
+    async def wait(self) -> None:
+        """Sleep until the earliest deadline, or until a guild gets scheduled"""
+        timeout = self.heap[0][0] - time.time() if self.heap else None
+        self.changed.clear()
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
 
 class ChatSummary(discord.Cog):
     def __init__(self, bot: discord.Bot) -> None:
         super().__init__()
         self.bot = bot
+        self.scheduler = MidnightScheduler()
+        self.loaded = False
 
     @discord.Cog.listener()
     async def on_ready(self):
-        self.summarize.start()
+        # on_ready also fires on every reconnect, the in-memory counters are kept up to date from there on
+        if not self.loaded:
+            try:
+                await load_enabled_channels()
+                self.loaded = True
+                await self.catch_up_summaries()
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+
+            for guild_id, _ in channel_counters.keys():
+                self.scheduler.schedule(guild_id)
+
+        if not self.summarize.is_running():
+            self.summarize.start()
+
+        if not self.flush_counts.is_running():
+            self.flush_counts.start()
+
+    def cog_unload(self) -> None:
+        self.flush_counts.cancel()
+        flush_pending_counts_sync()
 
     @discord.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -48,17 +311,7 @@ class ChatSummary(discord.Cog):
             if message.author.bot:
                 return
 
-            if client['ChatSummary'].count_documents(
-                    {'GuildID': str(message.guild.id), 'ChannelID': str(message.channel.id)}) == 0:
-                client['ChatSummary'].insert_one({
-                    'GuildID': str(message.guild.id),
-                    'ChannelID': str(message.channel.id),
-                    'Enabled': False,
-                    'MessageCount': 0
-                })
-
-            client['ChatSummary'].update_one({'GuildID': str(message.guild.id), 'ChannelID': str(message.channel.id)},
-                                             {'$inc': {f'Messages.{message.author.id}': 1, 'MessageCount': 1}})
+            count_message(message)
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
@@ -71,105 +324,127 @@ class ChatSummary(discord.Cog):
             if new_message.author.bot:
                 return
 
+            if (str(new_message.guild.id), str(new_message.channel.id)) not in channel_counters:
+                return
+
             countedits = get_setting(new_message.guild.id, "chatsummary_countedits", "False")
             if countedits == "False":
                 return
 
-            if client['ChatSummary'].count_documents(
-                    {'GuildID': str(new_message.guild.id), 'ChannelID': str(new_message.channel.id)}) == 0:
-                client['ChatSummary'].insert_one({
-                    'GuildID': str(new_message.guild.id),
-                    'ChannelID': str(new_message.channel.id),
-                    'Enabled': False,
-                    'MessageCount': 0
-                })
-
-            client['ChatSummary'].update_one(
-                {'GuildID': str(new_message.guild.id), 'ChannelID': str(new_message.channel.id)},
-                {'$inc': {f'Messages.{new_message.author.id}': 1, 'MessageCount': 1}})
+            count_message(new_message)
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
-    @tasks.loop(minutes=1)
-    async def summarize(self):
+    @tasks.loop(seconds=CHAT_SUMMARY_FLUSH_INTERVAL)
+    async def flush_counts(self):
         try:
-            res = client['ChatSummary'].find({'Enabled': True}).to_list()
-            for i in res:
-                yesterday = get_now_for_server(i['GuildID'])
-
-                if yesterday.hour != 0 or yesterday.minute != 0:
-                    continue
-
-                guild = self.bot.get_guild(int(i['GuildID']))
-                if guild is None:
-                    continue
-
-                channel = guild.get_channel(int(i['ChannelID']))
-                if channel is None:
-                    continue
-
-                if not channel.can_send():
-                    continue
-
-                yesterday = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=1)  # Get yesterday
-
-                # Get date format
-                date_format = get_setting(guild.id, "chatsummary_dateformat", "YYYY/MM/DD")
-
-                # Better formatting for day
-                day = str(yesterday.day)
-                if len(day) == 1:
-                    day = "0" + day
-
-                # Better formatting for the month
-                month = str(yesterday.month)
-                if len(month) == 1:
-                    month = "0" + month
-
-                # Select appropriate date format
-                if date_format == "DD/MM/YYYY":
-                    date = f"{day}/{month}/{yesterday.year}"
-                elif date_format == "DD. MM. YYYY":
-                    date = f"{day}. {month}. {yesterday.year}"
-                elif date_format == "YYYY/DD/MM":
-                    date = f"{yesterday.year}/{day}/{month}"
-                elif date_format == "MM/DD/YYYY":
-                    date = f"{month}/{day}/{yesterday.year}"
-                elif date_format == "YYYY年MM月DD日":
-                    date = f"{yesterday.year}年{month}月{day}日"
-                else:
-                    date = f"{yesterday.year}/{month}/{day}"
-
-                chat_summary_message = trl(0, guild.id, "chat_summary_title").format(date=date)
-                chat_summary_message += '\n'
-                chat_summary_message += trl(0, guild.id, "chat_summary_messages").format(
-                    messages=str(i['MessageCount']))
-
-                top_members = {k: v for k, v in sorted(i['Messages'].items(), key=lambda item: item[1], reverse=True)}
-
-                j = 0  # idk
-                for k, v in top_members.items():
-                    j += 1
-                    member = guild.get_member(int(k))
-                    if member is not None:
-                        chat_summary_message += trl(0, guild.id, "chat_summary_line").format(position=j,
-                                                                                             name=member.display_name,
-                                                                                             messages=v)
-                    else:
-                        chat_summary_message += trl(0, guild.id, "chat_summary_line_unknown_user").format(position=j,
-                                                                                                          id=k,
-                                                                                                          messages=v)
-
-                    if j >= int(get_setting(guild.id, "chatsummary_top_count", 5)):
-                        break
+            await flush_pending_counts()
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
 
+    @tasks.loop()
+    async def summarize(self):
+        try:
+            await self.scheduler.wait()
+            for guild_id in self.scheduler.pop_due():
                 try:
-                    await channel.send(chat_summary_message)
+                    await self.summarize_guild(guild_id)
                 except Exception as e:
                     sentry_sdk.capture_exception(e)
 
-                client['ChatSummary'].update_one({'GuildID': str(guild.id), 'ChannelID': str(channel.id)},
-                                                 {'$set': {'Messages': {}, 'MessageCount': 0}})
+                if any(key[0] == guild_id for key in channel_counters):
+                    self.scheduler.schedule(guild_id)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+    async def catch_up_summaries(self):
+        """Send the summaries of days that ended while the bot was offline"""
+        for i in await async_client['ChatSummary'].find({'Enabled': True}).to_list():
+            day = get_now_for_server(i['GuildID']).date() - datetime.timedelta(days=1)
+            if i.get('LastSummary', '') < day.isoformat():
+                await self.summarize_channel(i, day)
+
+    async def summarize_guild(self, guild_id: str):
+        await flush_pending_counts()
+
+        day = get_now_for_server(guild_id).date() - datetime.timedelta(days=1)
+        for i in await async_client['ChatSummary'].find({'GuildID': guild_id, 'Enabled': True}).to_list():
+            await self.summarize_channel(i, day)
+
+    async def summarize_channel(self, i: dict, yesterday: datetime.date):
+        """Post the summary of a day into a channel and reset the counts
+
+        Args:
+            i (dict): ChatSummary document
+            yesterday (datetime.date): The day that's being summarized
+        """
+        if i.get('LastSummary', '') >= yesterday.isoformat():
+            return
+
+        guild = self.bot.get_guild(int(i['GuildID']))
+        if guild is None:
+            return
+
+        channel = guild.get_channel(int(i['ChannelID']))
+        if channel is None:
+            return
+
+        if not channel.can_send():
+            return
+
+        # Days that ended while the bot was offline were never reset, so their messages are in these counts as well
+        first_day = yesterday
+        if i.get('LastSummary'):
+            first_day = min(datetime.date.fromisoformat(i['LastSummary']) + datetime.timedelta(days=1), yesterday)
+
+        # Claim the day first, so a day that gets summarized twice (the catch-up racing the scheduler, a timezone
+        # change moving midnight) is only archived and sent once
+        res = await async_client['ChatSummary'].update_one(
+            {'GuildID': str(guild.id), 'ChannelID': str(channel.id),
+             'LastSummary': {'$not': {'$gte': yesterday.isoformat()}}},
+            {'$set': {'MessageCount': 0, 'TopPosters': {}, 'LastSummary': yesterday.isoformat()},
+             '$unset': {'Messages': ''}})
+        if res.matched_count == 0:
+            return
+
+        # Messages sent from now on count for today. Marking the channel dirty overwrites a flush of the old counts
+        # that raced the reset above.
+        key = (str(guild.id), str(channel.id))
+        counter = channel_counters.get(key) or load_channel_counter(i)
+        if key in channel_counters:
+            channel_counters[key] = SpaceSaving(CHAT_SUMMARY_TOP_POSTERS_CAPACITY)
+            dirty_channels.add(key)
+
+        message_count = counter.total
+        top_members = counter.top(int(get_setting(guild.id, "chatsummary_top_count", 5)))
+        try:
+            await db_archive_day(str(guild.id), str(channel.id), yesterday, counter)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
+        if first_day == yesterday:
+            chat_summary_message = trl(0, guild.id, "chat_summary_title").format(
+                date=format_summary_date(guild.id, yesterday))
+        else:
+            chat_summary_message = trl(0, guild.id, "chat_summary_title_range").format(
+                start=format_summary_date(guild.id, first_day), end=format_summary_date(guild.id, yesterday))
+        chat_summary_message += '\n'
+        chat_summary_message += trl(0, guild.id, "chat_summary_messages").format(
+            messages=str(message_count))
+
+        for j, (k, v) in enumerate(top_members, start=1):
+            member = guild.get_member(int(k))
+            if member is not None:
+                chat_summary_message += trl(0, guild.id, "chat_summary_line").format(position=j,
+                                                                                     name=member.display_name,
+                                                                                     messages=v)
+            else:
+                chat_summary_message += trl(0, guild.id, "chat_summary_line_unknown_user").format(position=j,
+                                                                                                  id=k,
+                                                                                                  messages=v)
+
+        try:
+            await channel.send(chat_summary_message)
         except Exception as e:
             sentry_sdk.capture_exception(e)
 
@@ -184,12 +459,16 @@ class ChatSummary(discord.Cog):
     @analytics("chatsummary add")
     async def command_add(self, ctx: discord.ApplicationContext, channel: discord.TextChannel):
         try:
-            res = client['ChatSummary'].update_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)},
-                                                   {'$set': {'Enabled': True}})
-            if res.modified_count == 0:
+            res = await async_client['ChatSummary'].update_one(
+                {'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)}, {'$set': {'Enabled': True}}, upsert=True)
+            if res.upserted_id is None and res.modified_count == 0:
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "chat_summary_add_already_added"), ephemeral=True)
                 return
 
+            channel_counters[(str(ctx.guild.id), str(channel.id))] = SpaceSaving(
+                CHAT_SUMMARY_TOP_POSTERS_CAPACITY)
+            self.scheduler.schedule(str(ctx.guild.id))
+
             # Logging embed
             logging_embed = discord.Embed(title=trl(0, ctx.guild.id, "chat_summary_add_log_title"))
             logging_embed.add_field(name=trl(0, ctx.guild.id, "logging_channel"), value=f"{channel.mention}")
@@ -211,11 +490,13 @@ class ChatSummary(discord.Cog):
     @analytics("chatsummary remove")
     async def command_remove(self, ctx: discord.ApplicationContext, channel: discord.TextChannel):
         try:
-            res = client['ChatSummary'].update_one({'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)},
-                                                   {'$set': {'Enabled': False}})
+            res = await async_client['ChatSummary'].update_one(
+                {'GuildID': str(ctx.guild.id), 'ChannelID': str(channel.id)}, {'$set': {'Enabled': False}})
             if res.modified_count == 0:
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, 'chat_summary_remove_already_removed'), ephemeral=True)
 
+            channel_counters.pop((str(ctx.guild.id), str(channel.id)), None)
+
             # Logging embed
             logging_embed = discord.Embed(title=trl(ctx.user.id, ctx.guild.id, "chat_summary_remove_log_title"))
             logging_embed.add_field(name=trl(ctx.user.id, ctx.guild.id, "logging_channel"),
@@ -233,6 +514,42 @@ class ChatSummary(discord.Cog):
             sentry_sdk.capture_exception(e)
             await ctx.respond(trl(ctx.user.id, ctx.guild.id, "command_error_generic"), ephemeral=True)
 
+    @chat_summary_subcommand.command(name="history", description="Get the message history of a channel")
+    @commands_ext.guild_only()
+    @discord.default_permissions(manage_guild=True)
+    @commands_ext.has_permissions(manage_guild=True)
+    @discord.option(name="period", description="Period", choices=["day", "week", "month"])
+    @discord.option(name="count", description="How many periods to show", type=int, min_value=1, max_value=31)
+    @analytics("chatsummary history")
+    async def command_history(self, ctx: discord.ApplicationContext, channel: discord.TextChannel, period: str = "day",
+                              count: int = 7):
+        try:
+            if not channel.permissions_for(ctx.user).read_messages:
+                await ctx.respond(trl(ctx.user.id, ctx.guild.id, "chat_summary_history_no_access"), ephemeral=True)
+                return
+
+            rows = await db_get_archive(str(ctx.guild.id), str(channel.id), period, count)
+            if not rows:
+                await ctx.respond(trl(ctx.user.id, ctx.guild.id, "chat_summary_history_empty"), ephemeral=True)
+                return
+
+            message = trl(ctx.user.id, ctx.guild.id, "chat_summary_history_title").format(channel=channel.mention)
+            for row in rows:
+                top = SpaceSaving.from_document(1, row['MessageCount'], row['TopPosters']).top(1)
+                if top:
+                    member = ctx.guild.get_member(int(top[0][0]))
+                    message += trl(ctx.user.id, ctx.guild.id, "chat_summary_history_line").format(
+                        period=row['Bucket'], messages=row['MessageCount'],
+                        user=member.display_name if member is not None else f'User({top[0][0]})')
+                else:
+                    message += trl(ctx.user.id, ctx.guild.id, "chat_summary_history_line_no_top").format(
+                        period=row['Bucket'], messages=row['MessageCount'])
+
+            await ctx.respond(message, ephemeral=True)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            await ctx.respond(trl(ctx.user.id, ctx.guild.id, "command_error_generic"), ephemeral=True)
+
     @chat_summary_subcommand.command(name="dateformat", description="Set the date format of Chat Streak messages.")
     @commands_ext.guild_only()
     @discord.default_permissions(manage_guild=True)
@@ -17,6 +17,9 @@
 
 import discord
 
+from utils.languages import language_cache
+from utils.per_user_settings import user_settings_cache
+from utils.settings import settings_cache
 from utils.tzutil import get_now_for_server
 
 
@@ -33,3 +36,16 @@ class DebugCommands(discord.Cog):
     @dev_commands_group.command(name="now", description="Get now for server")
     async def now(self, ctx: discord.ApplicationContext):
         await ctx.respond(f"Current time: {get_now_for_server(ctx.guild.id).isoformat()}", ephemeral=True)
+
+    @dev_commands_group.command(name="cache", description="Get cache statistics")
+    async def cache(self, ctx: discord.ApplicationContext):
+        caches = {"Server settings": settings_cache, "User settings": user_settings_cache,
+                  "Languages": language_cache}
+
+        msg = ""
+        for name, cache in caches.items():
+            stats = cache.stats()
+            msg += (f"{name}: {stats['size']}/{stats['max_size']} entries, {stats['hits']} hits, "
+                    f"{stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)\n")
+
+        await ctx.respond(msg, ephemeral=True)
@@ -23,15 +23,19 @@ import sentry_sdk
 from bson import ObjectId
 from discord.ext import commands as commands_ext
 from discord.ext import tasks
+from pymongo import ASCENDING
 
 from database import client
 from utils.analytics import analytics
+from utils.db_indexes import declare_index
 from utils.generic import pretty_time_delta
 from utils.languages import get_translation_for_key_localized as trl, get_language
 from utils.per_user_settings import get_per_user_setting
 from utils.tips import append_tip_to_message
 from utils.tzutil import get_now_for_server
 
+declare_index('Giveaways', [('MessageID', ASCENDING)])
+
 
 class Giveaways(discord.Cog):
     giveaways_group = discord.SlashCommandGroup(name="giveaways")
@@ -15,80 +15,294 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+import asyncio
+import atexit
 import datetime
 import re
 
 import discord
 import emoji
 import sentry_sdk
-from discord.ext import commands as commands_ext, pages
+from discord.ext import commands as commands_ext, tasks
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 
-from database import client
+from database import client, async_client
 from utils.analytics import analytics
+from utils.cache import TTLCache
+from utils.config import get_key
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl, get_language
 from utils.logging_util import log_into_logs
 from utils.per_user_settings import get_per_user_setting, set_per_user_setting
-from utils.settings import get_setting, set_setting
+from utils.settings import get_setting, set_setting, get_settings_document
 from utils.tips import append_tip_to_message
 from utils.tzutil import get_now_for_server
 
+declare_index('Leveling', [('GuildID', ASCENDING), ('UserID', ASCENDING)], unique=True)
+declare_index('Leveling', [('GuildID', ASCENDING), ('XP', DESCENDING), ('UserID', ASCENDING)])
+declare_index('LevelingMultiplier', [('GuildID', ASCENDING), ('Name', ASCENDING)])
+
+
+def parse_multiplier_date(date) -> tuple[int, int]:
+    """Parse a multiplier start or end date into (month, day)
+
+    Args:
+        date (str | datetime.datetime): Date in format MM-DD, older records may store a datetime
+
+    Returns:
+        tuple: (month, day)
+    """
+    if isinstance(date, datetime.datetime):
+        return date.month, date.day
+
+    month, day = map(int, date.split('-'))
+    return month, day
+
+
+class MultiplierSchedule:
+    """The multipliers of a guild, parsed once.
+    Multipliers are active for whole days, so the active ones are only recomputed when the server-local day changes.
+    """
+
+    def __init__(self, multipliers: list[dict]) -> None:
+        self.windows = sorted(((parse_multiplier_date(m['StartDate']), parse_multiplier_date(m['EndDate']), m)
+                               for m in multipliers), key=lambda w: w[0])
+        self.day = None
+        self.active = []
+        self.product = 1
+
+    def update(self, day: datetime.date) -> None:
+        """Recompute the active multipliers if the day changed
+
+        Args:
+            day (datetime.date): Server-local date
+        """
+        if day == self.day:
+            return
+
+        today = (day.month, day.day)
+        self.active = []
+        self.product = 1
+        for start, end, m in self.windows:
+            # Windows with an end before their start wrap around the new year
+            if (start <= today <= end) if start <= end else (today >= start or today <= end):
+                self.active.append(m)
+                self.product *= m['Multiplier']
+
+        self.day = day
+
+
+MULTIPLIER_CACHE_SIZE = int(get_key("Leveling_MultiplierCacheSize", "10000"))
+MULTIPLIER_CACHE_TTL = int(get_key("Leveling_MultiplierCacheTTL", "3600"))
+
+# GuildID -> MultiplierSchedule, invalidated whenever a multiplier is added, changed or removed
+multiplier_schedules = TTLCache(MULTIPLIER_CACHE_SIZE, MULTIPLIER_CACHE_TTL)
+
+
+def get_multiplier_schedule(guild_id: int) -> MultiplierSchedule:
+    schedule = multiplier_schedules.get(str(guild_id))
+    if schedule is None:
+        schedule = MultiplierSchedule(db_multiplier_getall(guild_id))
+        multiplier_schedules.set(str(guild_id), schedule)
+
+    schedule.update(get_now_for_server(guild_id).date())
+    return schedule
+
 
 def db_calculate_multiplier(guild_id: int):
     multiplier = int(get_setting(guild_id, 'leveling_xp_multiplier', '1'))
+    return multiplier * get_multiplier_schedule(guild_id).product
 
-    multipliers = db_multiplier_getall(guild_id)
-    for m in multipliers:
-        start_month, start_day = map(int, m['StartDate'].split('-'))
-        end_month, end_day = map(int, m['EndDate'].split('-'))
 
-        now = get_now_for_server(guild_id)
-        start_date = datetime.datetime(now.year, start_month, start_day)
-        end_date = datetime.datetime(now.year, end_month, end_day, hour=23, minute=59, second=59)
+XP_FLUSH_INTERVAL = int(get_key("Leveling_XPFlushInterval", "10"))
+XP_FLUSH_THRESHOLD = int(get_key("Leveling_XPFlushThreshold", "5000"))
+XP_CACHE_SIZE = int(get_key("Leveling_XPCacheSize", "100000"))
+XP_CACHE_TTL = int(get_key("Leveling_XPCacheTTL", "3600"))
 
-        if end_date < start_date:
-            end_date = end_date.replace(year=end_date.year + 1)
+# (GuildID, UserID) -> XP not written to the database yet, flushed every XP_FLUSH_INTERVAL seconds
+pending_xp = {}
+# Held while buffered XP is being written. Cold reads take it as well, so they never see a bulk write that
+# is already applied while its XP is still counted in memory.
+xp_flush_lock = asyncio.Lock()
+# (GuildID, UserID) -> Total XP including the pending XP, so level ups can be detected without reading the database
+xp_totals = TTLCache(XP_CACHE_SIZE, XP_CACHE_TTL)
 
-        if start_date <= now <= end_date:
-            multiplier *= m['Multiplier']
 
-    return multiplier
+def _pending_xp_operations(batch: dict) -> list[UpdateOne]:
+    return [UpdateOne({'GuildID': guild_id, 'UserID': user_id}, {'$inc': {'XP': xp}}, upsert=True)
+            for (guild_id, user_id), xp in batch.items()]
 
 
-def db_get_user_xp(guild_id: int, user_id: int):
-    data = client['Leveling'].find_one({'GuildID': str(guild_id), 'UserID': str(user_id)})
-    return data['XP'] if data else 1
+def _requeue_pending_xp(batch: dict, e: Exception):
+    """Put XP from a failed flush back into the buffer, skipping the writes that did succeed"""
+    keys = list(batch.keys())
+    if isinstance(e, BulkWriteError):
+        keys = [keys[error['index']] for error in e.details.get('writeErrors', [])]
 
+    for key in keys:
+        pending_xp[key] = pending_xp.get(key, 0) + batch[key]
 
-def db_add_user_xp(guild_id: int, user_id: int, xp: int):
-    data = client['Leveling'].find_one({'GuildID': str(guild_id), 'UserID': str(user_id)})
-    if data:
-        current_xp = data['XP']
-        multiplier = db_calculate_multiplier(guild_id)
-        client['Leveling'].update_one({'GuildID': str(guild_id), 'UserID': str(user_id)}, {'$inc': {'XP': xp}},
-                                      upsert=True)
-    else:
-        client['Leveling'].insert_one({'GuildID': str(guild_id), 'UserID': str(user_id), 'XP': xp})
 
+async def flush_pending_xp():
+    """Write all buffered XP to the database with one bulk write"""
+    async with xp_flush_lock:
+        if not pending_xp:
+            return
 
-def get_level_for_xp(guild_id: int, xp: int):
-    level = 0
-    xp_needed = db_calculate_multiplier(guild_id) * int(get_setting(guild_id, 'leveling_xp_per_level', '500'))
-    while xp >= xp_needed:
-        level += 1
-        xp -= xp_needed
-        xp_needed = db_calculate_multiplier(guild_id) * int(get_setting(guild_id, 'leveling_xp_per_level', '500'))
+        batch = dict(pending_xp)
+        pending_xp.clear()
+        try:
+            await async_client['Leveling'].bulk_write(_pending_xp_operations(batch), ordered=False)
+        except Exception as e:
+            _requeue_pending_xp(batch, e)
+            raise
 
-    return level
 
+def flush_pending_xp_sync():
+    """Same as flush_pending_xp, for shutdown when the event loop is no longer running"""
+    if not pending_xp:
+        return
 
-def get_xp_for_level(guild_id: int, level: int):
-    xp = 0
-    xp_needed = db_calculate_multiplier(guild_id) * int(get_setting(guild_id, 'leveling_xp_per_level', '500'))
-    for _ in range(level):
-        xp += xp_needed
-        xp_needed = db_calculate_multiplier(guild_id) * int(get_setting(guild_id, 'leveling_xp_per_level', '500'))
+    batch = dict(pending_xp)
+    pending_xp.clear()
+    try:
+        client['Leveling'].bulk_write(_pending_xp_operations(batch), ordered=False)
+    except Exception as e:
+        _requeue_pending_xp(batch, e)
+        sentry_sdk.capture_exception(e)
+
+
+atexit.register(flush_pending_xp_sync)
+
+
+async def db_read_user_xp(guild_id: int, user_id: int) -> int | None:
+    """Read the total XP of a user from the database, including the XP that hasn't been flushed yet
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+
+    Returns:
+        int | None: Total XP, None if the user has never gotten any XP
+    """
+    key = (str(guild_id), str(user_id))
+    async with xp_flush_lock:
+        data = await async_client['Leveling'].find_one({'GuildID': str(guild_id), 'UserID': str(user_id)},
+                                                       {'_id': 0, 'XP': 1})
+
+    if data is None and key not in pending_xp:
+        return None
+
+    return (data['XP'] if data else 0) + pending_xp.get(key, 0)
+
+
+async def db_get_user_xp(guild_id: int, user_id: int):
+    xp = xp_totals.get((str(guild_id), str(user_id)))
+    if xp is not None:
+        return xp
+
+    xp = await db_read_user_xp(guild_id, user_id)
+    return xp if xp is not None else 1
+
+
+LEADERBOARD_SORT = [('XP', DESCENDING), ('UserID', ASCENDING)]
+
+
+async def db_get_leaderboard_page(guild_id: int, offset: int, limit: int) -> list[dict]:
+    """Get a slice of the XP ranking of a guild, highest XP first
+
+    Args:
+        guild_id (int): Guild ID
+        offset (int): Number of users to skip
+        limit (int): Maximum number of users
+
+    Returns:
+        list[dict]: UserID and XP of every user
+    """
+    cursor = async_client['Leveling'].find({'GuildID': str(guild_id)}, {'_id': 0, 'UserID': 1, 'XP': 1})
+    return await cursor.sort(LEADERBOARD_SORT).skip(offset).limit(limit).to_list()
+
+
+async def db_get_user_rank(guild_id: int, user_id: int, xp: int) -> int | None:
+    """Get the 1-based rank of a user in the guild.
+    Counts the users with more XP on the (GuildID, XP) index, so it reads as many index keys as the rank.
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+        xp (int): Current XP of the user
+
+    Returns:
+        int | None: Rank, None if the user doesn't have any XP yet
+    """
+    # Everyone's buffered XP has to be in the database for the count to be exact
+    try:
+        await flush_pending_xp()
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+
+    key = (str(guild_id), str(user_id))
+    if key not in xp_totals and key not in pending_xp:
+        if not await async_client['Leveling'].find_one({'GuildID': str(guild_id), 'UserID': str(user_id)},
+                                                       {'_id': 1}):
+            return None
+
+    return await async_client['Leveling'].count_documents({'GuildID': str(guild_id), 'XP': {'$gt': xp}}) + 1
+
+
+async def db_add_user_xp(guild_id: int, user_id: int, xp: int) -> tuple[int, int]:
+    """Add XP to a user. The XP is buffered and written to the database by flush_pending_xp.
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+        xp (int): XP to add
+
+    Returns:
+        tuple: XP before and after adding
+    """
+    key = (str(guild_id), str(user_id))
+    before = xp_totals.get(key)
+    if before is None:
+        total = await db_read_user_xp(guild_id, user_id)
+        # Another message could have loaded the total while waiting for the database
+        before = xp_totals.get(key)
+        if before is None:
+            before = total or 0
+
+    after = before + xp
+    xp_totals.set(key, after)
+    pending_xp[key] = pending_xp.get(key, 0) + xp
+
+    if len(pending_xp) >= XP_FLUSH_THRESHOLD:
+        try:
+            await flush_pending_xp()
+        except Exception as e:
+            # The XP stays buffered for the next flush, the level up itself is still exact
+            sentry_sdk.capture_exception(e)
+
+    return before, after
+
+
+def get_xp_per_level(guild_id: int) -> int:
+    """Get the XP needed for one level, every level needs the same amount of XP"""
+    return db_calculate_multiplier(guild_id) * int(get_setting(guild_id, 'leveling_xp_per_level', '500'))
+
+
+def level_for_xp(xp: int, xp_per_level: int) -> int:
+    if xp_per_level <= 0:
+        return 0
 
-    return xp
+    return max(xp, 0) // xp_per_level
+
+
+def get_level_for_xp(guild_id: int, xp: int):
+    return level_for_xp(xp, get_xp_per_level(guild_id))
+
+
+def get_xp_for_level(guild_id: int, level: int):
+    return level * get_xp_per_level(guild_id)
 
 
 def db_multiplier_add(guild_id: int, name: str, multiplier: int, start_date_month: int, start_date_day: int,
@@ -96,6 +310,7 @@ def db_multiplier_add(guild_id: int, name: str, multiplier: int, start_date_mont
     client['LevelingMultiplier'].insert_one({'GuildID': str(guild_id), 'Name': name, 'Multiplier': multiplier,
                                              'StartDate': '{:02d}-{:02d}'.format(start_date_month, start_date_day),
                                              'EndDate': '{:02d}-{:02d}'.format(end_date_month, end_date_day)})
+    multiplier_schedules.invalidate(str(guild_id))
 
 
 def db_multiplier_exists(guild_id: int, name: str):
@@ -105,24 +320,30 @@ def db_multiplier_exists(guild_id: int, name: str):
 
 def db_multiplier_change_name(guild_id: int, old_name: str, new_name: str):
     client['LevelingMultiplier'].update_one({'GuildID': str(guild_id), 'Name': old_name}, {'$set': {'Name': new_name}})
+    multiplier_schedules.invalidate(str(guild_id))
 
 
 def db_multiplier_change_multiplier(guild_id: int, name: str, multiplier: int):
     client['LevelingMultiplier'].update_one({'GuildID': str(guild_id), 'Name': name},
                                             {'$set': {'Multiplier': multiplier}})
+    multiplier_schedules.invalidate(str(guild_id))
 
 
 def db_multiplier_change_start_date(guild_id: int, name: str, start_date: datetime.datetime):
     client['LevelingMultiplier'].update_one({'GuildID': str(guild_id), 'Name': name},
-                                            {'$set': {'StartDate': start_date}})
+                                            {'$set': {'StartDate': start_date.strftime('%m-%d')}})
+    multiplier_schedules.invalidate(str(guild_id))
 
 
 def db_multiplier_change_end_date(guild_id: int, name: str, end_date: datetime.datetime):
-    client['LevelingMultiplier'].update_one({'GuildID': str(guild_id), 'Name': name}, {'$set': {'EndDate': end_date}})
+    client['LevelingMultiplier'].update_one({'GuildID': str(guild_id), 'Name': name},
+                                            {'$set': {'EndDate': end_date.strftime('%m-%d')}})
+    multiplier_schedules.invalidate(str(guild_id))
 
 
 def db_multiplier_remove(guild_id: int, name: str):
     client['LevelingMultiplier'].delete_one({'GuildID': str(guild_id), 'Name': name})
+    multiplier_schedules.invalidate(str(guild_id))
 
 
 def db_multiplier_getall(guild_id: int):
@@ -175,29 +396,178 @@ def validate_day(month: int, day: int, year: int) -> bool:
     return True
 
 
-async def update_roles_for_member(guild: discord.Guild, member: discord.Member):
-    xp = db_get_user_xp(guild.id, member.id)
-    level = get_level_for_xp(guild.id, xp)
+LEGACY_REWARD_KEY = re.compile(r'leveling_reward_(\d+)')
 
-    for i in range(1, level + 1):  # Add missing roles
-        role_id = get_setting(guild.id, f'leveling_reward_{i}', '0')
-        if role_id != '0':
-            role = guild.get_role(int(role_id))
-            if role.position > guild.me.top_role.position:
-                return
 
-            if role is not None and role not in member.roles:
-                await member.add_roles(role)
+def db_get_level_rewards(guild_id: int) -> dict[int, int]:
+    """Get the level rewards of a guild
 
-    for i in range(level + 1, 100):  # Remove excess roles
-        role_id = get_setting(guild.id, f'leveling_reward_{i}', '0')
-        if role_id != '0':
-            role = guild.get_role(int(role_id))
-            if role.position > guild.me.top_role.position:
-                return
+    Args:
+        guild_id (int): Guild ID
+
+    Returns:
+        dict: Level -> Role ID
+    """
+    rewards = get_setting(guild_id, 'leveling_rewards', None)
+    if rewards is None:
+        # Older versions stored every reward in its own leveling_reward_{level} setting, merge them into one map
+        rewards = {}
+        for key, role_id in get_settings_document(guild_id).items():
+            match = LEGACY_REWARD_KEY.fullmatch(key)
+            if match is not None and role_id != '0':
+                rewards[match.group(1)] = str(role_id)
+
+        # Only guilds that had rewards get the merged map written, the rest keep reading an empty map
+        if rewards:
+            set_setting(guild_id, 'leveling_rewards', rewards)
+
+    return {int(level): int(role_id) for level, role_id in rewards.items()}
+
+
+def db_set_level_reward(guild_id: int, level: int, role_id: int | None):
+    """Set or remove the reward role for a level
+
+    Args:
+        guild_id (int): Guild ID
+        level (int): Level
+        role_id (int | None): Role ID, None removes the reward
+    """
+    rewards = {str(k): str(v) for k, v in db_get_level_rewards(guild_id).items()}
+    if role_id is None:
+        rewards.pop(str(level), None)
+    else:
+        rewards[str(level)] = str(role_id)
+
+    set_setting(guild_id, 'leveling_rewards', rewards)
+
+
+async def update_roles_for_member(guild: discord.Guild, member: discord.Member, level: int = None):
+    """Give a member the reward roles of the levels they reached and take away the others.
+    Only the roles that differ are sent to Discord, so calling this when nothing changed doesn't make any requests.
+
+    Args:
+        guild (discord.Guild): Guild
+        member (discord.Member): Member
+        level (int): Level of the member, read from their XP if not given
+    """
+    rewards = db_get_level_rewards(guild.id)
+    if not rewards:
+        return
+
+    if level is None:
+        level = get_level_for_xp(guild.id, await db_get_user_xp(guild.id, member.id))
+
+    # A role may be the reward for multiple levels, it's kept if any of them has been reached
+    earned = {role_id for reward_level, role_id in rewards.items() if reward_level <= level}
+    has = {role.id for role in member.roles}
+    to_add = []
+    to_remove = []
+
+    for role_id in set(rewards.values()):
+        role = guild.get_role(role_id)
+        if role is None or role.managed or role.position >= guild.me.top_role.position:
+            continue
+
+        if role_id in earned and role_id not in has:
+            to_add.append(role)
+        elif role_id not in earned and role_id in has:
+            to_remove.append(role)
+
+    if to_add:
+        await member.add_roles(*to_add)
+    if to_remove:
+        await member.remove_roles(*to_remove)
+
+
+# Running sync_reward_roles tasks, the event loop only keeps weak references to them
+reward_syncs = set()
+
+
+async def sync_reward_roles(guild: discord.Guild, level: int):
+    """Update the reward roles of every member at or above a level, after the reward of that level changed
+
+    Args:
+        guild (discord.Guild): Guild
+        level (int): Level of the changed reward
+    """
+    try:
+        await flush_pending_xp()
+        query = {'GuildID': str(guild.id), 'XP': {'$gte': get_xp_for_level(guild.id, level)}}
+        async for i in async_client['Leveling'].find(query, {'_id': 0, 'UserID': 1}):
+            member = guild.get_member(int(i['UserID']))
+            if member is not None:
+                await update_roles_for_member(guild, member)
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+
+
+class LeaderboardView(discord.ui.View):
+    """Leaderboard paginator that only reads the page being looked at from the database"""
+
+    PAGE_SIZE = 10
+
+    def __init__(self, ctx: discord.ApplicationContext, xp_per_level: int):
+        super().__init__(timeout=300)
+
+        self.ctx = ctx
+        self.xp_per_level = xp_per_level
+        self.page = 0
+        self.page_starts = [0]  # Offset into the ranking of every page rendered so far
+
+        self.previous_button = discord.ui.Button(label="<", style=discord.ButtonStyle.secondary)
+        self.previous_button.callback = self.previous_page
+        self.add_item(self.previous_button)
+
+        self.next_button = discord.ui.Button(label=">", style=discord.ButtonStyle.secondary)
+        self.next_button.callback = self.next_page
+        self.add_item(self.next_button)
+
+    async def render(self) -> str:
+        """Render the current page, skipping members who have left the server"""
+        ctx = self.ctx
+        message = trl(ctx.user.id, ctx.guild.id, "leveling_leaderboard_title")
+        offset = self.page_starts[self.page]
+        rows = 0
+        while rows < self.PAGE_SIZE:
+            batch = await db_get_leaderboard_page(ctx.guild.id, offset, self.PAGE_SIZE)
+            for row in batch:
+                if rows == self.PAGE_SIZE:
+                    break
+
+                offset += 1
+                member = ctx.guild.get_member(int(row['UserID']))
+                if member is None:
+                    continue
+
+                rows += 1
+                message += trl(ctx.user.id, ctx.guild.id, "leveling_leaderboard_row").format(
+                    position=self.page * self.PAGE_SIZE + rows, user=member.mention,
+                    level=level_for_xp(row['XP'], self.xp_per_level), xp=row['XP'])
+
+            if len(batch) < self.PAGE_SIZE:
+                break
+
+        has_next = rows == self.PAGE_SIZE and len(await db_get_leaderboard_page(ctx.guild.id, offset, 1)) > 0
+
+        if has_next and len(self.page_starts) == self.page + 1:
+            self.page_starts.append(offset)
+
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = not has_next
+
+        if get_per_user_setting(ctx.user.id, 'tips_enabled', 'true') == 'true':
+            language = get_language(ctx.guild.id, ctx.user.id)
+            message = append_tip_to_message(ctx.guild.id, ctx.user.id, message, language)
+
+        return message
 
-            if role is not None and role in member.roles:
-                await member.remove_roles(role)
+    async def previous_page(self, interaction: discord.Interaction):
+        self.page = max(self.page - 1, 0)
+        await interaction.response.edit_message(content=await self.render(), view=self)
+
+    async def next_page(self, interaction: discord.Interaction):
+        self.page = min(self.page + 1, len(self.page_starts) - 1)
+        await interaction.response.edit_message(content=await self.render(), view=self)
 
 
 class Leveling(discord.Cog):
@@ -205,23 +575,41 @@ class Leveling(discord.Cog):
         self.bot = bot
         super().__init__()
 
+    @discord.Cog.listener()
+    async def on_ready(self):
+        if not self.flush_xp.is_running():
+            self.flush_xp.start()
+
+    def cog_unload(self) -> None:
+        self.flush_xp.cancel()
+        flush_pending_xp_sync()
+
+    @tasks.loop(seconds=XP_FLUSH_INTERVAL)
+    async def flush_xp(self):
+        try:
+            await flush_pending_xp()
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+
     @discord.Cog.listener()
     async def on_message(self, msg: discord.Message):
         try:
-            if msg.author.bot:
+            if msg.author.bot or msg.guild is None:
                 return
 
-            before_level = get_level_for_xp(msg.guild.id, db_get_user_xp(msg.guild.id, msg.author.id))
-            db_add_user_xp(msg.guild.id, msg.author.id, 3)
-            after_level = get_level_for_xp(msg.guild.id, db_get_user_xp(msg.guild.id, msg.author.id))
-
-            if not msg.channel.permissions_for(msg.guild.me).send_messages:
-                return
+            before_xp, after_xp = await db_add_user_xp(msg.guild.id, msg.author.id, 3)
+            xp_per_level = get_xp_per_level(msg.guild.id)
+            before_level = level_for_xp(before_xp, xp_per_level)
+            after_level = level_for_xp(after_xp, xp_per_level)
 
+            # Also runs without a level up, so rewards added since the last level up are handed out
             if msg.guild.me.guild_permissions.manage_roles:
-                await update_roles_for_member(msg.guild, msg.author)
+                await update_roles_for_member(msg.guild, msg.author, after_level)
+
+            if before_level == after_level:
+                return
 
-            if before_level != after_level and msg.channel.can_send():
+            if msg.channel.permissions_for(msg.guild.me).send_messages and msg.channel.can_send():
                 msg2 = await msg.channel.send(
                     trl(msg.author.id, msg.guild.id, "leveling_level_up").format(mention=msg.author.mention,
                                                                                  level=str(after_level)))
@@ -236,28 +624,15 @@ class Leveling(discord.Cog):
         try:
             user = user or ctx.user
 
-            level_xp = db_get_user_xp(ctx.guild.id, user.id)
-            level = get_level_for_xp(ctx.guild.id, level_xp)
+            level_xp = await db_get_user_xp(ctx.guild.id, user.id)
             multiplier = db_calculate_multiplier(ctx.guild.id)
-            next_level_xp = get_xp_for_level(ctx.guild.id, level + 1)
-            multiplier_list = db_multiplier_getall(ctx.guild.id)
+            xp_per_level = multiplier * int(get_setting(ctx.guild.id, 'leveling_xp_per_level', '500'))
+            level = level_for_xp(level_xp, xp_per_level)
+            next_level_xp = (level + 1) * xp_per_level
+            rank = await db_get_user_rank(ctx.guild.id, user.id, level_xp)
 
             msg = ""
-            for i in multiplier_list:
-                start_month, start_day = map(int, i['StartDate'].split('-'))
-                end_month, end_day = map(int, i['EndDate'].split('-'))
-
-                now = get_now_for_server(ctx.guild.id)
-                start_date = datetime.datetime(now.year, start_month, start_day)
-                end_date = datetime.datetime(now.year, end_month, end_day, hour=23, minute=59, second=59)
-
-                if end_date < start_date:
-                    end_date = end_date.replace(year=end_date.year + 1)
-
-                # continue if the multiplier is not active
-                if start_date > now or end_date < now:
-                    continue
-
+            for i in get_multiplier_schedule(ctx.guild.id).active:
                 msg += trl(ctx.user.id, ctx.guild.id, "leveling_level_multiplier_row").format(name=i['Name'],
                                                                                               multiplier=i[
                                                                                                   'Multiplier'],
@@ -272,6 +647,9 @@ class Leveling(discord.Cog):
                                                                                              next_level=level + 1,
                                                                                              multiplier=multiplier)
 
+                if rank is not None:
+                    response += trl(ctx.user.id, ctx.guild.id, "leveling_level_rank").format(rank=rank)
+
                 if len(msg) > 0:
                     response += trl(ctx.user.id, ctx.guild.id, "leveling_level_multiplier_title")
                     response += f'{msg}'
@@ -287,6 +665,9 @@ class Leveling(discord.Cog):
                                                                                                 next_level=level + 1,
                                                                                                 multiplier=multiplier)
 
+                if rank is not None:
+                    response += trl(ctx.user.id, ctx.guild.id, "leveling_level_rank").format(rank=rank)
+
                 if len(msg) > 0:
                     response += trl(ctx.user.id, ctx.guild.id, "leveling_level_multiplier_title")
                     response += f'{msg}'
@@ -703,16 +1084,20 @@ class Leveling(discord.Cog):
     async def set_reward(self, ctx: discord.ApplicationContext, level: int, role: discord.Role):
         try:
             # Get old setting
-            old_role_id = get_setting(ctx.guild.id, f"leveling_reward_{level}", '0')
-            old_role = ctx.guild.get_role(int(old_role_id))
+            old_role_id = db_get_level_rewards(ctx.guild.id).get(level)
+            old_role = ctx.guild.get_role(old_role_id) if old_role_id is not None else None
 
             # Set new setting
-            set_setting(ctx.guild.id, f'leveling_reward_{level}', str(role.id))
+            db_set_level_reward(ctx.guild.id, level, role.id)
+            if ctx.guild.me.guild_permissions.manage_roles:
+                task = asyncio.create_task(sync_reward_roles(ctx.guild, level))
+                reward_syncs.add(task)
+                task.add_done_callback(reward_syncs.discard)
 
             # Logging embed
             logging_embed = discord.Embed(title=trl(0, ctx.guild.id, "leveling_set_reward_log_title"))
             logging_embed.add_field(name=trl(0, ctx.guild.id, "logging_user"), value=f"{ctx.user.mention}")
-            if old_role_id == '0':
+            if old_role_id is None:
                 logging_embed.add_field(name=trl(0, ctx.guild.id, "logging_role"),
                                         value=trl(0, ctx.guild.id, "leveling_set_reward_log_role_added").format(
                                             reward=role.mention))
@@ -742,9 +1127,9 @@ class Leveling(discord.Cog):
     @analytics("leveling remove reward")
     async def remove_reward(self, ctx: discord.ApplicationContext, level: int):
         try:
-            # Get old settingF
-            old_role_id = get_setting(ctx.guild.id, f"leveling_reward_{level}", '0')
-            old_role = ctx.guild.get_role(int(old_role_id))
+            # Get old setting
+            old_role_id = db_get_level_rewards(ctx.guild.id).get(level)
+            old_role = ctx.guild.get_role(old_role_id) if old_role_id is not None else None
 
             # Logging embed
             logging_embed = discord.Embed(title=trl(ctx.user.id, ctx.guild.id, "leveling_remove_reward_log_title"))
@@ -760,7 +1145,7 @@ class Leveling(discord.Cog):
             await log_into_logs(ctx.guild, logging_embed)
 
             # Set new setting
-            set_setting(ctx.guild.id, f'leveling_reward_{level}', '0')
+            db_set_level_reward(ctx.guild.id, level, None)
 
             # Send response
             await ctx.respond(
@@ -798,58 +1183,8 @@ class Leveling(discord.Cog):
     @leveling_subcommand.command(name='leaderboard', description='Get the leaderboard for the server')
     async def leveling_lb(self, ctx: discord.ApplicationContext):
         try:
-            # Get the top 10 users
-            top_users = client['Leveling'].aggregate([
-                {
-                    '$match': {
-                        'GuildID': str(ctx.guild.id)
-                    }
-                },
-                {
-                    '$sort': {
-                        'XP': -1
-                    }
-                }
-            ])  # type: list[dict]
-            # has GuildID, UserID, XP
-
-            lb_pages = []
-            insert_last = False
-
-            # Create the embed
-            leaderboard_message = trl(ctx.user.id, ctx.guild.id, "leveling_leaderboard_title")
-
-            # Add the users to the embed
-            i = 1
-            for _, user in enumerate(top_users):
-                user_obj = ctx.guild.get_member(int(user['UserID']))
-                if user_obj is None:
-                    continue
-                leaderboard_message += trl(ctx.user.id, ctx.guild.id, "leveling_leaderboard_row").format(
-                    position=i, user=user_obj.mention, level=get_level_for_xp(ctx.guild.id, user['XP']), xp=user['XP'])
-                i += 1
-                insert_last = True
-
-                if i % 10 == 0:
-                    if get_per_user_setting(ctx.user.id, 'tips_enabled', 'true') == 'true':
-                        language = get_language(ctx.guild.id, ctx.user.id)
-                        leaderboard_message = append_tip_to_message(ctx.guild.id, ctx.user.id, leaderboard_message,
-                                                                    language)
-
-                    lb_pages.append(leaderboard_message)
-                    leaderboard_message = trl(ctx.user.id, ctx.guild.id, "leveling_leaderboard_title")
-                    insert_last = False
-
-            if not insert_last:
-                if get_per_user_setting(ctx.user.id, 'tips_enabled', 'true') == 'true':
-                    language = get_language(ctx.guild.id, ctx.user.id)
-                    leaderboard_message = append_tip_to_message(ctx.guild.id, ctx.user.id, leaderboard_message,
-                                                                language)
-
-                lb_pages.append(leaderboard_message)
-
-            pages_resp = pages.Paginator(pages=lb_pages)
-            await pages_resp.respond(ctx.interaction, ephemeral=True)
+            view = LeaderboardView(ctx, get_xp_per_level(ctx.guild.id))
+            await ctx.respond(await view.render(), view=view, ephemeral=True)
         except Exception as e:
             sentry_sdk.capture_exception(e)
             await ctx.respond(trl(ctx.user.id, ctx.guild.id, "command_error_generic"), ephemeral=True)
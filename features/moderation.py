@@ -20,10 +20,12 @@ import datetime
 import discord
 import sentry_sdk
 from discord.ext import commands as commands_ext
+from pymongo import ASCENDING
 
 from database import client
 from utils.analytics import analytics
 from utils.config import get_key
+from utils.db_indexes import declare_index
 from utils.generic import pretty_time_delta
 from utils.languages import get_translation_for_key_localized as trl, get_language
 from utils.logging_util import log_into_logs
@@ -31,9 +33,11 @@ from utils.per_user_settings import get_per_user_setting
 from utils.settings import get_setting, set_setting
 from utils.tips import append_tip_to_message
 from utils.tzutil import get_now_for_server
-from utils.warning import add_warning, db_get_warning_actions, db_add_warning_action, db_get_warnings, \
+from utils.warning import add_warning, db_get_warning_actions, db_add_warning_action, db_get_warnings_page, \
     db_remove_warning_action, db_remove_warning
 
+declare_index('ModeratorRoles', [('GuildID', ASCENDING), ('RoleID', ASCENDING)])
+
 
 def is_a_moderator(ctx: discord.ApplicationContext):
     roles = client['ModeratorRoles'].find({'GuildID': str(ctx.guild.id)})
@@ -43,6 +47,69 @@ def is_a_moderator(ctx: discord.ApplicationContext):
     return False
 
 
+class WarningsView(discord.ui.View):
+    """Warning list paginator that reads one page at a time from the database"""
+
+    PAGE_SIZE = 10
+
+    def __init__(self, ctx: discord.ApplicationContext, user: discord.Member):
+        super().__init__(timeout=300)
+
+        self.ctx = ctx
+        self.user = user
+        self.page = 0
+        self.page_starts = [None]  # ID of the warning before every page rendered so far
+
+        self.previous_button = discord.ui.Button(label="<", style=discord.ButtonStyle.secondary)
+        self.previous_button.callback = self.previous_page
+        self.add_item(self.previous_button)
+
+        self.next_button = discord.ui.Button(label=">", style=discord.ButtonStyle.secondary)
+        self.next_button.callback = self.next_page
+        self.add_item(self.next_button)
+
+    def render(self) -> str | None:
+        """Render the current page
+
+        Returns:
+            str | None: The page, None if the user has no warnings
+        """
+        ctx = self.ctx
+        # One extra warning tells whether there is a next page
+        warnings = db_get_warnings_page(ctx.guild.id, self.user.id, self.page_starts[self.page], self.PAGE_SIZE + 1)
+        if not warnings and self.page == 0:
+            return None
+
+        has_next = len(warnings) > self.PAGE_SIZE
+        warnings = warnings[:self.PAGE_SIZE]
+
+        message = trl(ctx.user.id, ctx.guild.id, "warn_list_title").format(user=self.user.mention)
+        for warning in warnings:
+            message += trl(ctx.user.id, ctx.guild.id, "warn_list_line").format(id=str(warning['_id']),
+                                                                               reason=warning['Reason'],
+                                                                               date=warning['Timestamp'])
+
+        if has_next and len(self.page_starts) == self.page + 1:
+            self.page_starts.append(warnings[-1]['_id'])
+
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = not has_next
+
+        if get_per_user_setting(ctx.user.id, 'tips_enabled', 'true') == 'true':
+            language = get_language(ctx.guild.id, ctx.user.id)
+            message = append_tip_to_message(ctx.guild.id, ctx.user.id, message, language)
+
+        return message
+
+    async def previous_page(self, interaction: discord.Interaction):
+        self.page = max(self.page - 1, 0)
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+    async def next_page(self, interaction: discord.Interaction):
+        self.page = min(self.page + 1, len(self.page_starts) - 1)
+        await interaction.response.edit_message(content=self.render(), view=self)
+
+
 class Moderation(discord.Cog):
     def __init__(self, bot: discord.Bot):
         self.bot = bot
@@ -408,19 +475,12 @@ class Moderation(discord.Cog):
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "moderation_not_moderator"), ephemeral=True)
                 return
 
-            # check: warning exists
-            warnings = db_get_warnings(ctx.guild.id, user.id)
-            if not warnings:
-                await ctx.respond(trl(ctx.user.id, ctx.guild.id, "warn_list_no_warnings"), ephemeral=True)
-                return
-
-            if warning_id not in [str(warning['_id']) for warning in warnings]:
+            if not db_remove_warning(ctx.guild.id, user.id, warning_id):
                 await ctx.respond(
                     trl(ctx.user.id, ctx.guild.id, "warn_remove_error_warning_not_found").format(id=warning_id),
                     ephemeral=True)
                 return
 
-            db_remove_warning(ctx.guild.id, warning_id)
             ephemerality = get_setting(ctx.guild.id, "moderation_ephemeral", "true")
             await ctx.respond(
                 trl(ctx.user.id, ctx.guild.id, "warn_remove_response", append_tip=True).format(id=warning_id,
@@ -450,21 +510,13 @@ class Moderation(discord.Cog):
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "moderation_not_moderator"), ephemeral=True)
                 return
 
-            warnings = db_get_warnings(ctx.guild.id, user.id)
-            if not warnings:
+            view = WarningsView(ctx, user)
+            warning_str = view.render()
+            if warning_str is None:
                 await ctx.respond(f'{user.mention} has no warnings.', ephemeral=True)
                 return
 
-            warning_str = trl(ctx.user.id, ctx.guild.id, "warn_list_title").format(user=user.mention)
-            for warning in warnings:
-                warning_str += trl(ctx.user.id, ctx.guild.id, "warn_list_line").format(id=str(warning['_id']),
-                                                                                       reason=warning['Reason'],
-                                                                                       date=warning['Timestamp'])
-
-            if get_per_user_setting(ctx.user.id, 'tips_enabled', 'true') == 'true':
-                language = get_language(ctx.guild.id, ctx.user.id)
-                warning_str = append_tip_to_message(ctx.guild.id, ctx.user.id, warning_str, language)
-            await ctx.respond(warning_str, ephemeral=True)
+            await ctx.respond(warning_str, view=view, ephemeral=True)
         except Exception as e:
             sentry_sdk.capture_exception(e)
             await ctx.respond(trl(ctx.user.id, ctx.guild.id, "command_error_generic"), ephemeral=True)
@@ -519,6 +571,32 @@ class Moderation(discord.Cog):
             sentry_sdk.capture_exception(e)
             await ctx.respond(trl(ctx.user.id, ctx.guild.id, "command_error_generic"), ephemeral=True)
 
+    @warning_group.command(name='expiry', description='Set after how many days new warnings expire')
+    @commands_ext.guild_only()
+    @discord.default_permissions(manage_guild=True)
+    @commands_ext.has_permissions(manage_guild=True)
+    @discord.option(name='days', description='Days until a warning expires, 0 to keep warnings forever', type=int,
+                    min_value=0, max_value=3650)
+    @analytics("warn expiry")
+    async def set_warning_expiry(self, ctx: discord.ApplicationContext, days: int):
+        try:
+            old_days = get_setting(ctx.guild.id, 'warning_expiry_days', '0')
+            set_setting(ctx.guild.id, 'warning_expiry_days', str(days))
+
+            if days > 0:
+                response = trl(ctx.user.id, ctx.guild.id, "warn_expiry_set_response", append_tip=True).format(days=days)
+            else:
+                response = trl(ctx.user.id, ctx.guild.id, "warn_expiry_disabled_response", append_tip=True)
+            await ctx.respond(response, ephemeral=True)
+
+            log_embed = discord.Embed(title=trl(0, ctx.guild.id, "warn_expiry_log_title"), color=discord.Color.blue())
+            log_embed.add_field(name=trl(0, ctx.guild.id, "warn_expiry_log_days"), value=f'{old_days} -> {days}')
+
+            await log_into_logs(ctx.guild, log_embed)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            await ctx.respond(trl(ctx.user.id, ctx.guild.id, "command_error_generic"), ephemeral=True)
+
     warning_actions_group = discord.SlashCommandGroup(name='warn_actions', description='Warning action commands')
 
     @warning_actions_group.command(name='add',
@@ -565,9 +643,9 @@ class Moderation(discord.Cog):
 
             action_str = trl(ctx.user.id, ctx.guild.id, "warn_actions_list_title")
             for action in actions:
-                action_str += trl(ctx.user.id, ctx.guild.id, "warn_actions_list_line").format(id=action[0],
-                                                                                              action=action[1],
-                                                                                              warnings=action[2])
+                action_str += trl(ctx.user.id, ctx.guild.id, "warn_actions_list_line").format(id=str(action['_id']),
+                                                                                              action=action['Action'],
+                                                                                              warnings=action['Warnings'])
 
             ephemerality = get_setting(ctx.guild.id, "moderation_ephemeral", "true")
 
@@ -592,16 +670,10 @@ class Moderation(discord.Cog):
                                   ephemeral=True)
                 return
 
-            actions = db_get_warning_actions(ctx.guild.id)
-            if not actions:
-                await ctx.respond(trl(ctx.user.id, ctx.guild.id, "warn_actions_list_empty"), ephemeral=True)
-                return
-
-            if warning_action_id not in [action[0] for action in actions]:
+            if not db_remove_warning_action(ctx.guild.id, warning_action_id):
                 await ctx.respond(trl(ctx.user.id, ctx.guild.id, "warn_actions_doesnt_exist"), ephemeral=True)
                 return
 
-            db_remove_warning_action(warning_action_id)
             ephemerality = get_setting(ctx.guild.id, "moderation_ephemeral", "true")
             await ctx.respond(trl(ctx.user.id, ctx.guild.id, "warn_actions_remove_response", append_tip=True),
                               ephemeral=ephemerality == "true")
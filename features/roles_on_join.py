@@ -17,11 +17,15 @@
 
 import discord
 import sentry_sdk
+from pymongo import ASCENDING
 
 from database import client
 from utils.analytics import analytics
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 
+declare_index('RolesOnJoin', [('GuildID', ASCENDING), ('RoleID', ASCENDING)])
+
 
 class RolesOnJoin(discord.Cog):
     def __init__(self, bot: discord.Bot):
@@ -1,11 +1,15 @@
 import discord
 import sentry_sdk
 from discord.ext import commands
+from pymongo import ASCENDING
 
 from database import client
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 from utils.settings import get_setting, set_setting
 
+declare_index('SuggestionChannels', [('ChannelID', ASCENDING)])
+
 
 #      Akabot is a general purpose bot with a ton of features.
 #      Copyright (C) 2023-2025 mldchan
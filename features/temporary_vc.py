@@ -22,11 +22,16 @@ import sentry_sdk
 from discord import Interaction, Embed, Color
 from discord.ext import commands
 from discord.ui import View, Modal, InputText
+from pymongo import ASCENDING
 
 from database import client
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 from utils.settings import get_setting, set_setting
 
+declare_index('TemporaryVC', [('GuildID', ASCENDING), ('ChannelID', ASCENDING)])
+declare_index('TemporaryVCCreators', [('GuildID', ASCENDING), ('ChannelID', ASCENDING)])
+
 
 class V2NameChangeModal(Modal):
     def __init__(self, ch_id: int):
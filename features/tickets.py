@@ -19,13 +19,18 @@
 import discord
 import sentry_sdk
 from discord.ext import commands, tasks
+from pymongo import ASCENDING
 
 from database import client
+from utils.db_indexes import declare_index
 from utils.languages import get_translation_for_key_localized as trl
 from utils.logging_util import log_into_logs
 from utils.settings import set_setting, get_setting
 from utils.tzutil import get_now_for_server
 
+declare_index('TicketChannels', [('GuildID', ASCENDING), ('TicketChannelID', ASCENDING)], unique=True)
+declare_index('TicketChannels', [('ATime', ASCENDING)])
+
 
 def db_add_ticket_channel(guild_id: int, ticket_category: int, user_id: int):
     client['TicketChannels'].insert_one(
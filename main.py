@@ -47,9 +47,12 @@ from features import welcoming, leveling, antiraid, chat_streaks, chat_revive, c
     roles_on_join, heartbeat, automod_actions, power_outage_announcement, per_user_settings, server_settings, \
     bot_help, announcement_channels, tickets, debug_commands, birthday_announcements, \
     send_server_count, suggestions, temporary_vc, rp, statistics_channels
+from database import client
 from utils.config import get_key
 from utils.db_converter import update
+from utils.db_indexes import ensure_indexes
 from utils.languages import get_translation_for_key_localized as trl
+from utils.translations import load_catalogs
 
 log_level = get_key("Log_Level", "info")
 if log_level == "debug":
@@ -84,6 +87,8 @@ intents = discord.Intents.default()
 intents.members = True
 
 update()
+ensure_indexes(client)
+load_catalogs()
 
 bot = discord.Bot(intents=intents)
 
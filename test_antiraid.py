@@ -0,0 +1,200 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# database.py needs credentials to build the connection string, these tests never connect
+os.environ.setdefault('DB_USERNAME', 'test')
+os.environ.setdefault('DB_PASSWORD', 'test')
+
+from features.antiraid import DuplicateContentIndex, ViolationCounters, normalize_content  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr('features.antiraid.time.time', clock)
+    return clock
+
+
+def member(guild_id: int, user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(id=user_id, guild=SimpleNamespace(id=guild_id))
+
+
+def message(guild_id: int, channel: str, message_id: int, user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(id=message_id, channel=channel, guild=SimpleNamespace(id=guild_id),
+                           author=SimpleNamespace(id=user_id))
+
+
+def test_violation_counters_are_separate(clock):
+    counters = ViolationCounters()
+    counters.add_action('spam', member(1, 10), 60)
+    counters.add_action('spam', member(1, 10), 60)
+    counters.add_action('spam', member(1, 11), 60)
+    counters.add_action('spam', member(2, 10), 60)
+    counters.add_action('invite', member(1, 10), 60)
+
+    assert counters.count_actions('spam', member(1, 10)) == 2
+    assert counters.count_actions('spam', member(1, 11)) == 1
+    assert counters.count_actions('spam', member(2, 10)) == 1
+    assert counters.count_actions('invite', member(1, 10)) == 1
+    assert counters.count_actions('invite', member(2, 11)) == 0
+
+
+def test_violation_counters_slide(clock):
+    counters = ViolationCounters()
+    user = member(1, 10)
+    counters.add_action('spam', user, 10)
+    clock.now += 5
+    counters.add_action('spam', user, 10)
+
+    assert counters.count_actions('spam', user) == 2
+
+    clock.now += 5  # the first action expires exactly now
+    assert counters.count_actions('spam', user) == 1
+
+    clock.now += 5
+    assert counters.count_actions('spam', user) == 0
+    assert (1, 10, 'spam') not in counters.windows
+
+
+def test_guild_actions_are_separate_from_user_actions(clock):
+    counters = ViolationCounters()
+    guild = SimpleNamespace(id=1)
+    counters.add_guild_action('join', guild, 60)
+    counters.add_guild_action('join', guild, 60)
+    counters.add_action('join', member(1, 10), 60)
+
+    assert counters.count_guild_actions('join', guild) == 2
+    assert counters.count_actions('join', member(1, 10)) == 1
+
+
+def test_violation_counters_sweep_idle_windows(clock):
+    counters = ViolationCounters()
+    counters.add_action('spam', member(1, 10), 10)
+    counters.add_action('spam', member(1, 11), 1000)
+
+    clock.now += ViolationCounters.SWEEP_INTERVAL
+    counters.count_actions('spam', member(1, 12))
+
+    assert (1, 10, 'spam') not in counters.windows
+    assert (1, 11, 'spam') in counters.windows
+
+
+def test_violation_counters_reject_negative_expiry(clock):
+    with pytest.raises(ValueError):
+        ViolationCounters().add_action('spam', member(1, 10), -1)
+
+
+def test_normalize_content():
+    assert normalize_content('  Join   MY\nServer ') == 'join my server'
+
+
+def test_duplicate_index_finds_copies_in_all_channels(clock):
+    index = DuplicateContentIndex(100)
+    index.add(message(1, 'general', 1, 10), 42, 30)
+    index.add(message(1, 'memes', 2, 11), 42, 30)
+    index.add(message(1, 'general', 3, 12), 7, 30)
+    index.add(message(2, 'general', 4, 13), 42, 30)
+
+    same = index.add(message(1, 'art', 5, 14), 42, 30)
+
+    assert same == [('general', 1, 10), ('memes', 2, 11), ('art', 5, 14)]
+
+
+def test_duplicate_index_window(clock):
+    index = DuplicateContentIndex(100)
+    index.add(message(1, 'general', 1, 10), 42, 30)
+    clock.now += 20
+    index.add(message(1, 'general', 2, 11), 42, 30)
+    clock.now += 10
+
+    same = index.add(message(1, 'general', 3, 12), 42, 30)
+
+    assert [message_id for _, message_id, _ in same] == [2, 3]
+
+
+def test_duplicate_index_size_limit(clock):
+    index = DuplicateContentIndex(3)
+    for i in range(5):
+        same = index.add(message(1, 'general', i, i), 42, 30)
+
+    assert [message_id for _, message_id, _ in same] == [2, 3, 4]
+    assert len(index.guilds[1][0]) == 3
+
+
+def test_duplicate_index_remove(clock):
+    index = DuplicateContentIndex(3)
+    index.add(message(1, 'general', 1, 10), 42, 30)
+    index.add(message(1, 'general', 2, 11), 42, 30)
+    index.remove(1, 42)
+    index.remove(2, 42)
+
+    assert index.add(message(1, 'general', 3, 12), 42, 30) == [('general', 3, 12)]
+
+    # The entries of the removed messages leave the queue without taking newer copies with them
+    same = index.add(message(1, 'general', 4, 13), 42, 30)
+    assert [message_id for _, message_id, _ in same] == [3, 4]
+
+
+def test_duplicate_index_flags_expire(clock):
+    index = DuplicateContentIndex(100)
+    index.flag(1, 42, 30)
+
+    assert index.is_flagged(1, 42)
+    assert not index.is_flagged(1, 7)
+    assert not index.is_flagged(2, 42)
+
+    clock.now += 30
+    assert not index.is_flagged(1, 42)
+
+
+def test_duplicate_index_sweeps_idle_guilds(clock):
+    index = DuplicateContentIndex(100)
+    index.add(message(1, 'general', 1, 10), 42, 30)
+    index.flag(1, 42, 30)
+
+    clock.now += DuplicateContentIndex.SWEEP_INTERVAL
+    index.add(message(2, 'general', 2, 11), 7, 30)
+
+    assert 1 not in index.guilds
+    assert (1, 42) not in index.flagged
+    assert 2 in index.guilds
+
+
+def test_duplicate_index_sweeps_every_guild_by_its_own_window(clock):
+    index = DuplicateContentIndex(100)
+    index.add(message(1, 'general', 1, 10), 42, 300)
+    index.add(message(2, 'general', 2, 11), 42, 10)
+
+    clock.now += DuplicateContentIndex.SWEEP_INTERVAL
+    index.add(message(3, 'general', 3, 12), 7, 10)
+
+    # Guild 2's window passed, guild 1 keeps its messages for 300 seconds
+    assert 2 not in index.guilds
+    assert [message_id for _, message_id, _ in index.add(message(1, 'general', 4, 13), 42, 300)] == [1, 4]
@@ -0,0 +1,124 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(monkeypatch, max_size: int, ttl: float) -> tuple[TTLCache, FakeClock]:
+    clock = FakeClock()
+    monkeypatch.setattr('utils.cache.time.monotonic', clock)
+    return TTLCache(max_size, ttl), clock
+
+
+def test_get_and_set(monkeypatch):
+    cache, _ = make_cache(monkeypatch, 10, 60)
+    cache.set('a', 1)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('b', 'default') == 'default'
+    assert 'a' in cache
+    assert 'b' not in cache
+
+
+def test_evicts_least_recently_used(monkeypatch):
+    cache, _ = make_cache(monkeypatch, 2, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # b is now the least recently used
+    cache.set('c', 3)
+
+    assert cache.keys() == ['a', 'c']
+    assert cache.get('b') is None
+
+
+def test_set_refreshes_recency(monkeypatch):
+    cache, _ = make_cache(monkeypatch, 2, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 10)
+    cache.set('c', 3)
+
+    assert cache.keys() == ['a', 'c']
+    assert cache.get('a') == 10
+
+
+def test_entries_expire(monkeypatch):
+    cache, clock = make_cache(monkeypatch, 10, 60)
+    cache.set('a', 1)
+    clock.now += 30
+    cache.set('b', 2)
+
+    clock.now += 30
+    assert cache.get('a') == 1  # expires after the ttl, not at it
+
+    clock.now += 1
+    assert cache.get('a') is None
+    assert 'a' not in cache
+    assert cache.get('b') == 2
+
+    clock.now += 30
+    assert 'b' not in cache
+
+
+def test_reading_does_not_extend_expiry(monkeypatch):
+    cache, clock = make_cache(monkeypatch, 10, 60)
+    cache.set('a', 1)
+    clock.now += 50
+    cache.get('a')
+    clock.now += 20
+
+    assert cache.get('a') is None
+
+
+def test_invalidate_and_clear(monkeypatch):
+    cache, _ = make_cache(monkeypatch, 10, 60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.keys() == ['b']
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_stats(monkeypatch):
+    cache, clock = make_cache(monkeypatch, 10, 60)
+    assert cache.stats()['hit_rate'] == 0.0
+
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    clock.now += 61
+    cache.get('a')  # expired entries count as misses
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['hit_rate'] == 0.5
+    assert stats['size'] == 0
@@ -0,0 +1,123 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+from collections import Counter
+
+from utils.heavy_hitters import SpaceSaving
+
+
+def assert_within_bounds(counter: SpaceSaving, real: Counter):
+    """A tracked count is never below the real count and never above the real count plus its error"""
+    for item, count in counter.counts.items():
+        assert count - counter.errors[item] <= real[item] <= count
+
+
+def test_exact_below_capacity():
+    counter = SpaceSaving(3)
+    for item in ['a', 'b', 'a', 'c', 'a', 'b']:
+        counter.add(item)
+
+    assert counter.counts == {'a': 3, 'b': 2, 'c': 1}
+    assert counter.errors == {'a': 0, 'b': 0, 'c': 0}
+    assert counter.total == 6
+    assert counter.top(2) == [('a', 3), ('b', 2)]
+
+
+def test_replaces_lowest_count():
+    counter = SpaceSaving(2)
+    counter.add('a', 5)
+    counter.add('b', 2)
+    counter.add('c')
+
+    assert counter.counts == {'a': 5, 'c': 3}
+    assert counter.errors['c'] == 2
+    assert counter.total == 8
+
+
+def test_error_bounds():
+    stream = ['a'] * 50 + ['b'] * 30 + [f'x{i}' for i in range(40)] + ['a'] * 10 + ['c'] * 20
+    counter = SpaceSaving(5)
+    for item in stream:
+        counter.add(item)
+
+    real = Counter(stream)
+    assert counter.total == len(stream)
+    assert_within_bounds(counter, real)
+    # Items above total / capacity are always tracked
+    assert 'a' in counter.counts
+    assert counter.top(1)[0][0] == 'a'
+
+
+def test_merge():
+    first_stream = ['a'] * 10 + ['b'] * 4 + ['c', 'd', 'e']
+    second_stream = ['b'] * 8 + ['f'] * 3 + ['a', 'g', 'h']
+    first = SpaceSaving(3)
+    second = SpaceSaving(3)
+    for item in first_stream:
+        first.add(item)
+    for item in second_stream:
+        second.add(item)
+
+    first.merge(second)
+
+    real = Counter(first_stream + second_stream)
+    assert first.total == len(first_stream) + len(second_stream)
+    assert len(first.counts) <= 3
+    assert_within_bounds(first, real)
+    assert {item for item, _ in first.top(2)} == {'a', 'b'}
+
+
+def test_merge_into_empty_is_exact_copy():
+    counter = SpaceSaving(4)
+    for item in ['a', 'a', 'b']:
+        counter.add(item)
+
+    merged = SpaceSaving(4)
+    merged.merge(counter)
+
+    assert merged.counts == counter.counts
+    assert merged.errors == counter.errors
+    assert merged.total == counter.total
+
+
+def test_document_round_trip():
+    counter = SpaceSaving(2)
+    for item in ['a', 'a', 'a', 'b', 'c']:
+        counter.add(item)
+
+    loaded = SpaceSaving.from_document(2, counter.total, counter.to_document())
+
+    assert loaded.counts == counter.counts
+    assert loaded.errors == counter.errors
+    assert loaded.total == counter.total
+
+
+def test_from_document_keeps_highest_counts():
+    loaded = SpaceSaving.from_document(2, 10, {'a': [1, 0], 'b': [6, 0], 'c': [3, 1]})
+
+    assert loaded.counts == {'b': 6, 'c': 3}
+    assert loaded.errors == {'b': 0, 'c': 1}
+    assert loaded.total == 10
+
+
+def test_clear():
+    counter = SpaceSaving(2)
+    counter.add('a')
+    counter.clear()
+
+    assert counter.total == 0
+    assert counter.top(5) == []
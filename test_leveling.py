@@ -0,0 +1,105 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import datetime
+import os
+
+# database.py needs credentials to build the connection string, these tests never connect
+os.environ.setdefault('DB_USERNAME', 'test')
+os.environ.setdefault('DB_PASSWORD', 'test')
+
+from features.leveling import MultiplierSchedule, parse_multiplier_date, level_for_xp  # noqa: E402
+
+
+def multiplier(name: str, value: int, start: str, end: str) -> dict:
+    return {'Name': name, 'Multiplier': value, 'StartDate': start, 'EndDate': end}
+
+
+def active_names(schedule: MultiplierSchedule, day: datetime.date) -> list[str]:
+    schedule.update(day)
+    return [m['Name'] for m in schedule.active]
+
+
+def test_parse_multiplier_date():
+    assert parse_multiplier_date('03-07') == (3, 7)
+    assert parse_multiplier_date(datetime.datetime(2024, 12, 24, 10, 30)) == (12, 24)
+
+
+def test_window_within_a_year():
+    schedule = MultiplierSchedule([multiplier('summer', 2, '06-01', '08-31')])
+
+    assert active_names(schedule, datetime.date(2025, 5, 31)) == []
+    assert active_names(schedule, datetime.date(2025, 6, 1)) == ['summer']
+    assert active_names(schedule, datetime.date(2025, 8, 31)) == ['summer']
+    assert active_names(schedule, datetime.date(2025, 9, 1)) == []
+
+
+def test_window_wrapping_the_new_year():
+    schedule = MultiplierSchedule([multiplier('holidays', 3, '12-20', '01-10')])
+
+    assert active_names(schedule, datetime.date(2025, 12, 19)) == []
+    assert active_names(schedule, datetime.date(2025, 12, 20)) == ['holidays']
+    assert active_names(schedule, datetime.date(2025, 12, 31)) == ['holidays']
+    assert active_names(schedule, datetime.date(2026, 1, 1)) == ['holidays']
+    assert active_names(schedule, datetime.date(2026, 1, 10)) == ['holidays']
+    assert active_names(schedule, datetime.date(2026, 1, 11)) == []
+    assert active_names(schedule, datetime.date(2026, 7, 1)) == []
+
+
+def test_single_day_window():
+    schedule = MultiplierSchedule([multiplier('birthday', 5, '04-02', '04-02')])
+
+    assert active_names(schedule, datetime.date(2025, 4, 1)) == []
+    assert active_names(schedule, datetime.date(2025, 4, 2)) == ['birthday']
+    assert active_names(schedule, datetime.date(2025, 4, 3)) == []
+
+
+def test_overlapping_windows_multiply():
+    schedule = MultiplierSchedule([multiplier('holidays', 3, '12-20', '01-10'),
+                                   multiplier('december', 2, '12-01', '12-31')])
+
+    schedule.update(datetime.date(2025, 12, 25))
+    assert schedule.product == 6
+    assert sorted(m['Name'] for m in schedule.active) == ['december', 'holidays']
+
+    schedule.update(datetime.date(2026, 1, 5))
+    assert schedule.product == 3
+
+    schedule.update(datetime.date(2026, 2, 1))
+    assert schedule.product == 1
+    assert schedule.active == []
+
+
+def test_update_only_recomputes_when_the_day_changes():
+    schedule = MultiplierSchedule([multiplier('summer', 2, '06-01', '08-31')])
+    schedule.update(datetime.date(2025, 7, 1))
+    active = schedule.active
+
+    schedule.update(datetime.date(2025, 7, 1))
+    assert schedule.active is active
+
+    schedule.update(datetime.date(2025, 7, 2))
+    assert schedule.active is not active
+    assert schedule.product == 2
+
+
+def test_level_for_xp():
+    assert level_for_xp(0, 500) == 0
+    assert level_for_xp(499, 500) == 0
+    assert level_for_xp(500, 500) == 1
+    assert level_for_xp(-20, 500) == 0
+    assert level_for_xp(1000, 0) == 0
@@ -17,8 +17,12 @@
 
 
 from discord.ext import commands as commands_ext
+from pymongo import ASCENDING
 
 from database import client
+from utils.db_indexes import declare_index
+
+declare_index('Analytics', [('Command', ASCENDING)], unique=True)
 
 
 def db_add_analytics(command: str):
@@ -15,7 +15,12 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
+from pymongo import ASCENDING
+
 from database import client
+from utils.db_indexes import declare_index
+
+declare_index('AnnouncementChannels', [('GuildID', ASCENDING), ('ChannelID', ASCENDING)])
 
 
 def db_add_announcement_channel(guild_id: int, channel_id: int):
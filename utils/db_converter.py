@@ -21,7 +21,25 @@ import sqlite3
 from database import client
 
 
+def add_chat_streak_lengths():
+    if os.path.exists("data/streaks_converted.flag"):
+        return
+
+    # Chat streaks stored before the Streak field existed
+    res = client['ChatStreaks'].update_many({'Streak': {'$exists': False}}, [
+        {'$set': {'Streak': {'$max': [{'$toInt': {
+            '$divide': [{'$subtract': ['$LastMessage', '$StartTime']}, 86400000]}}, 0]}}}
+    ])
+    print(f'[DB Conversion] Added streak lengths to {res.modified_count} chat streaks')
+
+    os.makedirs("data", exist_ok=True)
+    with open("data/streaks_converted.flag", "w") as f:
+        f.write("")
+
+
 def update():
+    add_chat_streak_lengths()
+
     if os.path.exists("data/converted.flag"):
         print('[DB Conversion] Conversion already done, skipping...')
         return
@@ -0,0 +1,129 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import logging
+
+from pymongo import IndexModel, monitoring
+from pymongo.errors import OperationFailure
+
+# Collection -> list of (keys, unique, expire_after_seconds) declared by the modules querying it
+declared_indexes: dict[str, list[tuple[list[tuple[str, int]], bool, int | None]]] = {}
+
+
+def declare_index(collection: str, keys: list[tuple[str, int]], unique: bool = False,
+                  expire_after_seconds: int | None = None) -> None:
+    """Declare an index a module needs. Declarations are created by ensure_indexes on startup.
+
+    Args:
+        collection (str): Collection name
+        keys (list): Index keys, as (field, direction) pairs
+        unique (bool, optional): Whether the index is unique. Defaults to False.
+        expire_after_seconds (int | None, optional): Makes it a TTL index, deleting documents this many seconds after
+            the date in the indexed field. Defaults to None.
+    """
+    declared_indexes.setdefault(collection, []).append((keys, unique, expire_after_seconds))
+
+
+def ensure_indexes(db) -> None:
+    """Create every declared index that doesn't exist yet. Existing indexes are left untouched.
+
+    Args:
+        db: pymongo Database
+    """
+    for collection, indexes in declared_indexes.items():
+        existing = [info['key'] for info in db[collection].index_information().values()]
+
+        for keys, unique, expire_after_seconds in indexes:
+            if keys in existing:
+                continue
+
+            options = {} if expire_after_seconds is None else {'expireAfterSeconds': expire_after_seconds}
+            try:
+                db[collection].create_indexes([IndexModel(keys, unique=unique, **options)])
+                logging.info("Created index %s on %s", keys, collection)
+            except OperationFailure as e:
+                if not unique:
+                    logging.error("Failed to create index %s on %s: %s", keys, collection, e)
+                    continue
+
+                # Most likely duplicate documents, an index that is not unique still speeds up the queries
+                logging.error("Failed to create unique index %s on %s, creating a regular index instead: %s",
+                              keys, collection, e)
+                db[collection].create_indexes([IndexModel(keys, **options)])
+
+
+def get_query_filters(command_name: str, command: dict) -> list[dict]:
+    """Get the query filters of a MongoDB command
+
+    Args:
+        command_name (str): Command name, like find or update
+        command (dict): Command document
+
+    Returns:
+        list: Query filters of the command
+    """
+    if command_name == 'find':
+        return [command.get('filter', {})]
+    if command_name in ('count', 'findAndModify'):
+        return [command.get('query', {})]
+    if command_name == 'update':
+        return [i.get('q', {}) for i in command.get('updates', [])]
+    if command_name == 'delete':
+        return [i.get('q', {}) for i in command.get('deletes', [])]
+    if command_name == 'aggregate':
+        pipeline = command.get('pipeline', [])
+        if pipeline and '$match' in pipeline[0]:
+            return [pipeline[0]['$match']]
+
+    return []
+
+
+def is_query_indexed(collection: str, fields: set[str]) -> bool:
+    if '_id' in fields:
+        return True
+
+    return any(keys[0][0] in fields for keys, _, _ in declared_indexes.get(collection, []))
+
+
+class UnindexedQueryReporter(monitoring.CommandListener):
+    """Logs every query shape that no declared index can serve, once per shape"""
+
+    def __init__(self) -> None:
+        self.reported = set()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            return
+
+        for query in get_query_filters(event.command_name, event.command):
+            fields = {i for i in query.keys() if not i.startswith('$')}
+            if not fields or is_query_indexed(collection, fields):
+                continue
+
+            shape = (collection, event.command_name, tuple(sorted(fields)))
+            if shape in self.reported:
+                continue
+
+            self.reported.add(shape)
+            logging.warning("Unindexed query on %s: %s on %s", collection, event.command_name, ', '.join(shape[2]))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
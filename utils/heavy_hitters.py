@@ -0,0 +1,126 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import heapq
+from operator import itemgetter
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitter counter.
+    Tracks at most `capacity` items. When a new item arrives while full, it replaces the item with the lowest count
+    and inherits that count as its error, so a tracked count is never lower than the real count and never higher
+    than the real count plus its error. The total is always exact.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}  # item -> count
+        self.errors = {}  # item -> maximum overestimation of the count
+
+    def add(self, item: str, count: int = 1) -> None:
+        """Count an item
+
+        Args:
+            item (str): Item
+            count (int): How many times it occurred
+        """
+        self.total += count
+
+        if item in self.counts:
+            self.counts[item] += count
+            return
+
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            return
+
+        victim = min(self.counts, key=self.counts.get)
+        victim_count = self.counts.pop(victim)
+        del self.errors[victim]
+
+        self.counts[item] = victim_count + count
+        self.errors[item] = victim_count
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        """Add the counts of another counter into this one
+
+        Args:
+            other (SpaceSaving): Counter to merge
+        """
+        # An item a full counter doesn't track occurred at most as often as its lowest tracked item
+        own_min = min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+        other_min = min(other.counts.values()) if len(other.counts) >= other.capacity else 0
+
+        counts = {}
+        errors = {}
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, own_min) + other.counts.get(item, other_min)
+            errors[item] = self.errors.get(item, own_min) + other.errors.get(item, other_min)
+
+        self.counts = {}
+        self.errors = {}
+        for item, count in heapq.nlargest(self.capacity, counts.items(), key=itemgetter(1)):
+            self.counts[item] = count
+            self.errors[item] = errors[item]
+
+        self.total += other.total
+
+    def top(self, n: int) -> list[tuple[str, int]]:
+        """Get the n items with the highest counts
+
+        Args:
+            n (int): Number of items
+
+        Returns:
+            list: (item, count), highest count first
+        """
+        return heapq.nlargest(n, self.counts.items(), key=itemgetter(1))
+
+    def clear(self) -> None:
+        self.total = 0
+        self.counts.clear()
+        self.errors.clear()
+
+    def to_document(self) -> dict:
+        """Convert to a dict that can be stored in the database
+
+        Returns:
+            dict: item -> [count, error]
+        """
+        return {item: [count, self.errors[item]] for item, count in self.counts.items()}
+
+    @classmethod
+    def from_document(cls, capacity: int, total: int, document: dict) -> 'SpaceSaving':
+        """Load a counter stored with to_document
+
+        Args:
+            capacity (int): Maximum number of tracked items
+            total (int): Exact total count
+            document (dict): item -> [count, error]
+
+        Returns:
+            SpaceSaving: The counter
+        """
+        counter = cls(capacity)
+        counter.total = total
+        for item, (count, error) in heapq.nlargest(capacity, document.items(), key=lambda i: i[1][0]):
+            counter.counts[item] = count
+            counter.errors[item] = error
+
+        return counter
@@ -15,13 +15,20 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-import json
 import logging
-import os.path
 
-from utils.per_user_settings import get_per_user_setting, set_per_user_setting
-from utils.settings import get_setting, set_setting
+from utils.cache import TTLCache
+from utils.config import get_key
+from utils.per_user_settings import get_per_user_setting, set_per_user_setting, add_user_setting_listener
+from utils.settings import get_setting, set_setting, add_setting_listener
 from utils.tips import append_tip_to_message
+from utils.translations import get_catalog, get_raw_catalog, get_available_languages, language_exists
+
+LANGUAGE_CACHE_SIZE = int(get_key("Language_CacheSize", "50000"))
+LANGUAGE_CACHE_TTL = int(get_key("Language_CacheTTL", "300"))
+
+# (UserID, GuildID) -> resolved language code
+language_cache = TTLCache(LANGUAGE_CACHE_SIZE, LANGUAGE_CACHE_TTL)
 
 
 def get_translation_for_key_localized(user_id: int, guild_id: int, key: str, append_tip=False) -> str:
@@ -36,16 +43,8 @@ def get_translation_for_key_localized(user_id: int, guild_id: int, key: str, app
     Returns:
         str: Translation
     """
-    translation = ""
     language = get_language(guild_id, user_id)
-
-    with open(f"lang/{language}.json", encoding='utf8') as f:
-        translations: dict = json.load(f)
-
-    with open('lang/en.json', encoding='utf8') as f:
-        en_translations: dict = json.load(f)
-
-    translation = translations.get(key, translation) or en_translations.get(key, translation) or f"lang.en.{key}"
+    translation = get_catalog(language).get(key) or f"lang.en.{key}"
 
     if append_tip and get_per_user_setting(user_id, "tips_enabled", "true") == "true":
         return append_tip_to_message(guild_id, user_id, translation, language)
@@ -64,42 +63,85 @@ def get_language(guild_id: int, user_id: int) -> str:
         str: Language code
     """
 
+    language = language_cache.get((str(user_id), str(guild_id)))
+    if language is None:
+        language = resolve_language(guild_id, user_id)
+        language_cache.set((str(user_id), str(guild_id)), language)
+
+    return language
+
+
+def resolve_language(guild_id: int, user_id: int) -> str:
+    """Look up the language for a user, guild or use English as a
+    fallback, bypassing the language cache
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+
+    Returns:
+        str: Language code
+    """
+
     # Get user language
     if user_id != 0:
         user_lang = get_per_user_setting(user_id, "language", "en")
-        if not os.path.exists(f"lang/{user_lang}.json"):
+        if not language_exists(user_lang):
             set_per_user_setting(user_id, "language", "en")
             logging.error(
                 "WARNING: User {id} has somehow set the user language to {lang}, which is not a valid language. "
                 "Reset to EN".format(id=user_id, lang=user_lang))
+            user_lang = "en"
         return user_lang
 
     # Get server language
     if guild_id != 0:
         server_lang = get_setting(guild_id, "language", "en")
-        if not os.path.exists(f"lang/{server_lang}.json"):
+        if not language_exists(server_lang):
             set_setting(guild_id, "language", "en")
             logging.error(
                 "WARNING: Server {id} has somehow set the server language to {lang}, which is not a valid language. "
                 "Reset to EN".format(id=guild_id, lang=server_lang))
+            server_lang = "en"
         return server_lang
 
     # Global (English)
     return "en"
 
 
+def invalidate_language_cache(user_id: int = None, guild_id: int = None) -> None:
+    """Drop resolved languages for a user and/or a guild
+
+    Args:
+        user_id (int, optional): User ID
+        guild_id (int, optional): Guild ID
+    """
+    for key in language_cache.keys():
+        if (user_id is not None and key[0] == str(user_id)) or (guild_id is not None and key[1] == str(guild_id)):
+            language_cache.invalidate(key)
+
+
+def _on_server_setting_changed(guild_id: int, key: str, value) -> None:
+    if key == "language":
+        invalidate_language_cache(guild_id=guild_id)
+
+
+def _on_user_setting_changed(user_id: int, setting_name: str, setting_value) -> None:
+    if setting_name == "language":
+        invalidate_language_cache(user_id=user_id)
+
+
+add_setting_listener(_on_server_setting_changed)
+add_user_setting_listener(_on_user_setting_changed)
+
+
 def get_list_of_languages():
     """Get a list of languages
 
     Returns:
         list: List of languages
     """
-    languages = []
-    for file in os.listdir("lang"):
-        if file.endswith(".json"):
-            languages.append(file[:-5])
-
-    return languages
+    return list(get_available_languages())
 
 
 def get_language_completeness(lang: str) -> int:
@@ -109,16 +151,11 @@ def get_language_completeness(lang: str) -> int:
         int: Percentage of translations completed
     """
     # Validate lang exists
-    if not os.path.exists(f"lang/{lang}.json"):
+    if not language_exists(lang):
         raise ValueError("Language does not exist")
 
-    # Load English translations
-    with open("lang/en.json", encoding='utf8') as f:
-        en_translations: dict = json.load(f)
-
-    # Load target language
-    with open(f"lang/{lang}.json", encoding='utf8') as f:
-        lang_translations: dict = json.load(f)
+    en_translations = get_raw_catalog("en")
+    lang_translations = get_raw_catalog(lang)
 
     total = len(en_translations)
     translated = 0
@@ -142,11 +179,10 @@ def get_language_name(lang_code: str, completeness: bool = True) -> str:
         return 'English'
 
     # Validate lang exists
-    if not os.path.exists(f"lang/{lang_code}.json"):
+    if not language_exists(lang_code):
         raise ValueError("Language does not exist")
 
-    with open(f"lang/{lang_code}.json", encoding='utf8') as f:
-        name = json.load(f).get("language", lang_code)
+    name = get_raw_catalog(lang_code).get("language", lang_code)
 
     completeness_percent = get_language_completeness(lang_code)
     if completeness:
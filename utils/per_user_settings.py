@@ -15,22 +15,72 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from database import client
+from pymongo import ASCENDING, ReturnDocument
+
+from database import client, async_client
+from utils.cache import TTLCache
+from utils.config import get_key
+from utils.db_indexes import declare_index
+
+declare_index('UserSettings', [('UserID', ASCENDING)], unique=True)
+
+USER_SETTINGS_CACHE_SIZE = int(get_key("UserSettings_CacheSize", "50000"))
+USER_SETTINGS_CACHE_TTL = int(get_key("UserSettings_CacheTTL", "300"))
+
+# UserID -> UserSettings document, write-through from set_per_user_setting
+user_settings_cache = TTLCache(USER_SETTINGS_CACHE_SIZE, USER_SETTINGS_CACHE_TTL)
+
+# Called with (user_id, setting_name, setting_value) after a setting was changed
+user_setting_listeners = []
+
+
+def add_user_setting_listener(listener) -> None:
+    user_setting_listeners.append(listener)
 
 
 def get_per_user_setting(user_id: int, setting_name: str, default_value) -> str:
-    res = client['UserSettings'].find_one({'UserID': str(user_id)})
-    return res[setting_name] if res and setting_name in res else default_value
+    res = user_settings_cache.get(str(user_id))
+    if res is None:
+        res = client['UserSettings'].find_one({'UserID': str(user_id)}) or {}
+        user_settings_cache.set(str(user_id), res)
 
+    return res[setting_name] if setting_name in res else default_value
 
-def set_per_user_setting(user_id: int, setting_name: str, setting_value):
+
+async def get_per_user_setting_async(user_id: int, setting_name: str, default_value) -> str:
+    res = user_settings_cache.get(str(user_id))
+    if res is None:
+        res = await async_client['UserSettings'].find_one({'UserID': str(user_id)}) or {}
+        user_settings_cache.set(str(user_id), res)
+
+    return res[setting_name] if setting_name in res else default_value
+
+
+def _user_setting_update(setting_name: str, setting_value) -> dict:
     if setting_name == "_id" or setting_name == "UserID":
         raise Exception('Invalid setting name')
 
-    if client['UserSettings'].count_documents({'UserID': str(user_id)}) == 0:
-        client['UserSettings'].insert_one({'UserID': str(user_id)})
-
     if setting_value is not None:
-        client['UserSettings'].update_one({'UserID': str(user_id)}, {'$set': {setting_name: setting_value}})
-    else:
-        client['UserSettings'].update_one({'UserID': str(user_id)}, {'$unset': {setting_name: 1}})
+        return {'$set': {setting_name: setting_value}}
+    return {'$unset': {setting_name: 1}}
+
+
+def _user_setting_changed(user_id: int, setting_name: str, setting_value, res: dict) -> None:
+    user_settings_cache.set(str(user_id), res)
+
+    for listener in user_setting_listeners:
+        listener(user_id, setting_name, setting_value)
+
+
+def set_per_user_setting(user_id: int, setting_name: str, setting_value):
+    update = _user_setting_update(setting_name, setting_value)
+    res = client['UserSettings'].find_one_and_update({'UserID': str(user_id)}, update, upsert=True,
+                                                     return_document=ReturnDocument.AFTER)
+    _user_setting_changed(user_id, setting_name, setting_value, res)
+
+
+async def set_per_user_setting_async(user_id: int, setting_name: str, setting_value):
+    update = _user_setting_update(setting_name, setting_value)
+    res = await async_client['UserSettings'].find_one_and_update({'UserID': str(user_id)}, update, upsert=True,
+                                                                 return_document=ReturnDocument.AFTER)
+    _user_setting_changed(user_id, setting_name, setting_value, res)
@@ -15,24 +15,80 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-from database import client
+from pymongo import ASCENDING, ReturnDocument
+
+from database import client, async_client
+from utils.cache import TTLCache
+from utils.config import get_key
+from utils.db_indexes import declare_index
+
+declare_index('ServerSettings', [('GuildID', ASCENDING)], unique=True)
+
+SETTINGS_CACHE_SIZE = int(get_key("Settings_CacheSize", "10000"))
+SETTINGS_CACHE_TTL = int(get_key("Settings_CacheTTL", "300"))
+
+# GuildID -> ServerSettings document, write-through from set_setting
+settings_cache = TTLCache(SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL)
+
+# Called with (server_id, key, value) after a setting was changed
+setting_listeners = []
+
+
+def add_setting_listener(listener) -> None:
+    setting_listeners.append(listener)
+
+
+def get_settings_document(server_id: int) -> dict:
+    doc = settings_cache.get(str(server_id))
+    if doc is not None:
+        return doc
+
+    doc = client['ServerSettings'].find_one({'GuildID': str(server_id)}) or {}
+    settings_cache.set(str(server_id), doc)
+    return doc
+
+
+async def get_settings_document_async(server_id: int) -> dict:
+    doc = settings_cache.get(str(server_id))
+    if doc is not None:
+        return doc
+
+    doc = await async_client['ServerSettings'].find_one({'GuildID': str(server_id)}) or {}
+    settings_cache.set(str(server_id), doc)
+    return doc
 
 
 def get_setting(server_id: int, key: str, default):
-    res = client['ServerSettings'].find_one({'GuildID': str(server_id)})
-    if not res:
-        return default
-    if key not in res:
-        return default
+    res = get_settings_document(server_id)
+    return res[key] if key in res else default
 
-    return res[key] if res and key in res else default
 
+async def get_setting_async(server_id: int, key: str, default):
+    res = await get_settings_document_async(server_id)
+    return res[key] if key in res else default
 
-def set_setting(server_id: int, key: str, value) -> None:
-    if client['ServerSettings'].count_documents({'GuildID': str(server_id)}) == 0:
-        client['ServerSettings'].insert_one({'GuildID': str(server_id)})
 
+def _setting_update(key: str, value) -> dict:
     if value is not None:
-        client['ServerSettings'].update_one({'GuildID': str(server_id)}, {'$set': {key: value}})
-    else:
-        client['ServerSettings'].update_one({'GuildID': str(server_id)}, {'$unset': {key: 1}})
+        return {'$set': {key: value}}
+    return {'$unset': {key: 1}}
+
+
+def _setting_changed(server_id: int, key: str, value, doc: dict) -> None:
+    settings_cache.set(str(server_id), doc)
+
+    for listener in setting_listeners:
+        listener(server_id, key, value)
+
+
+def set_setting(server_id: int, key: str, value) -> None:
+    doc = client['ServerSettings'].find_one_and_update({'GuildID': str(server_id)}, _setting_update(key, value),
+                                                       upsert=True, return_document=ReturnDocument.AFTER)
+    _setting_changed(server_id, key, value, doc)
+
+
+async def set_setting_async(server_id: int, key: str, value) -> None:
+    doc = await async_client['ServerSettings'].find_one_and_update({'GuildID': str(server_id)},
+                                                                   _setting_update(key, value), upsert=True,
+                                                                   return_document=ReturnDocument.AFTER)
+    _setting_changed(server_id, key, value, doc)
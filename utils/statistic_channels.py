@@ -14,7 +14,12 @@
 #      You should have received a copy of the GNU Affero General Public License
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
+from pymongo import ASCENDING
+
 from database import client
+from utils.db_indexes import declare_index
+
+declare_index('StatisticChannels', [('GuildID', ASCENDING), ('ChannelID', ASCENDING)], unique=True)
 
 
 def db_get_statistic_channels(guild_id: int):
@@ -15,9 +15,9 @@
 #      along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 
-import json
 import random
-import re
+
+from utils.translations import get_tips
 
 
 def get_tips_from_lang_file(guild_id: int, user_id: int, lang: str) -> list[str]:
@@ -31,15 +31,7 @@ def get_tips_from_lang_file(guild_id: int, user_id: int, lang: str) -> list[str]
     Returns:
         list: List of tips
     """
-    with open(f"lang/{lang}.json", encoding='utf8') as f:
-        file = json.load(f)
-
-    tips = []
-    for key in file:
-        if re.match(r"^tip_\d+$", key):
-            tips.append(file[key])
-
-    return tips
+    return get_tips(lang)
 
 
 def append_tip_to_message(guild_id: int, user_id: int, msg: str, lang: str) -> str:
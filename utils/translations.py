@@ -0,0 +1,109 @@
+#      Akabot is a general purpose bot with a ton of features.
+#      Copyright (C) 2023-2025 mldchan
+#
+#      This program is free software: you can redistribute it and/or modify
+#      it under the terms of the GNU Affero General Public License as
+#      published by the Free Software Foundation, either version 3 of the
+#      License, or (at your option) any later version.
+#
+#      This program is distributed in the hope that it will be useful,
+#      but WITHOUT ANY WARRANTY; without even the implied warranty of
+#      MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#      GNU Affero General Public License for more details.
+#
+#      You should have received a copy of the GNU Affero General Public License
+#      along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+import re
+
+# Language code -> parsed lang/{code}.json, loaded once per process
+raw_catalogs: dict[str, dict] = {}
+
+# Language code -> translations with the English fallback merged in
+catalogs: dict[str, dict] = {}
+
+# Language code -> list of tips in that language
+tip_catalogs: dict[str, list[str]] = {}
+
+available_languages: list[str] = []
+
+
+def get_available_languages() -> list[str]:
+    """Get the language codes that have a file in lang/
+
+    Returns:
+        list: List of language codes
+    """
+    if not available_languages:
+        for file in sorted(os.listdir("lang")):
+            if file.endswith(".json"):
+                available_languages.append(file[:-5])
+
+    return available_languages
+
+
+def language_exists(lang: str) -> bool:
+    return lang in get_available_languages()
+
+
+def get_raw_catalog(lang: str) -> dict:
+    """Get the translations of a language exactly as they are in its file
+
+    Args:
+        lang (str): Language code
+
+    Returns:
+        dict: Translations
+    """
+    catalog = raw_catalogs.get(lang)
+    if catalog is None:
+        with open(f"lang/{lang}.json", encoding='utf8') as f:
+            catalog = json.load(f)
+        raw_catalogs[lang] = catalog
+
+    return catalog
+
+
+def get_catalog(lang: str) -> dict:
+    """Get the translations of a language, with missing or empty keys filled in from English
+
+    Args:
+        lang (str): Language code
+
+    Returns:
+        dict: Translations
+    """
+    catalog = catalogs.get(lang)
+    if catalog is None:
+        catalog = dict(get_raw_catalog("en"))
+        catalog.update({k: v for k, v in get_raw_catalog(lang).items() if v})
+        catalogs[lang] = catalog
+
+    return catalog
+
+
+def get_tips(lang: str) -> list[str]:
+    """Get the tips of a language, without the English fallback
+
+    Args:
+        lang (str): Language code
+
+    Returns:
+        list: List of tips
+    """
+    tips = tip_catalogs.get(lang)
+    if tips is None:
+        tips = [v for k, v in get_raw_catalog(lang).items() if re.match(r"^tip_\d+$", k)]
+        tip_catalogs[lang] = tips
+
+    return tips
+
+
+def load_catalogs() -> None:
+    """Parse every language file up front, so the first messages don't pay for it"""
+    for lang in get_available_languages():
+        get_catalog(lang)
+        get_tips(lang)
@@ -19,24 +19,61 @@ import datetime
 
 import discord
 from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-from database import client
+from database import client, async_client
+from utils.cache import TTLCache
+from utils.config import get_key
+from utils.db_indexes import declare_index
 from utils.generic import get_date_time_str, pretty_time_delta
 from utils.languages import get_translation_for_key_localized as trl
-from utils.settings import get_setting
+from utils.settings import get_setting_async
+
+declare_index('Warnings', [('GuildID', ASCENDING), ('UserID', ASCENDING), ('_id', ASCENDING)])
+declare_index('WarningActions', [('GuildID', ASCENDING)])
+declare_index('WarningCounts', [('GuildID', ASCENDING), ('UserID', ASCENDING)], unique=True)
+# Mongo deletes expired warnings by itself, warnings without ExpiresAt are kept forever
+declare_index('Warnings', [('ExpiresAt', ASCENDING)], expire_after_seconds=0)
+
+WARNING_LADDER_CACHE_SIZE = int(get_key("Warnings_LadderCacheSize", "10000"))
+WARNING_LADDER_CACHE_TTL = int(get_key("Warnings_LadderCacheTTL", "3600"))
+
+# GuildID -> {warning count -> actions}, invalidated when a warning action is added or removed
+warning_ladders = TTLCache(WARNING_LADDER_CACHE_SIZE, WARNING_LADDER_CACHE_TTL)
+
+
+def active_warnings_query(guild_id: int, user_id: int) -> dict:
+    """Query matching the warnings of a user that haven't expired yet.
+    The TTL monitor only runs about once a minute, so expired warnings can still be in the collection for a bit.
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+
+    Returns:
+        dict: Query
+    """
+    return {'GuildID': str(guild_id), 'UserID': str(user_id),
+            '$or': [{'ExpiresAt': None}, {'ExpiresAt': {'$gt': datetime.datetime.now(datetime.UTC)}}]}
 
 
 async def add_warning(user: discord.Member, guild: discord.Guild, reason: str) -> ObjectId:
-    id = db_add_warning(guild.id, user.id, reason)
+    expiry_days = int(await get_setting_async(guild.id, 'warning_expiry_days', '0'))
+    expires_at = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=expiry_days) if expiry_days > 0 else None
+
+    id = await db_add_warning_async(guild.id, user.id, reason, expires_at)
+    warning_count = await db_increment_warning_count_async(guild.id, user.id, expires_at)
 
-    warning_should_dm = get_setting(guild.id, 'send_warning_message', 'true')
+    warning_should_dm = await get_setting_async(guild.id, 'send_warning_message', 'true')
     if warning_should_dm == 'true':
-        warning_message = get_setting(guild.id, 'warning_message', 'You have been warned in {guild} for {reason}.')
+        warning_message = await get_setting_async(guild.id, 'warning_message',
+                                                  'You have been warned in {guild} for {reason}.')
 
         warning_message = warning_message.replace('{name}', user.display_name)
         warning_message = warning_message.replace('{guild}', guild.name)
         warning_message = warning_message.replace('{reason}', reason)
-        warning_message = warning_message.replace('{warnings}', str(len(db_get_warnings(guild.id, user.id))))
+        warning_message = warning_message.replace('{warnings}', str(warning_count))
 
         # try dm user
         try:
@@ -44,85 +81,175 @@ async def add_warning(user: discord.Member, guild: discord.Guild, reason: str) -
         except Exception:
             pass
 
-    warnings = db_get_warnings(guild.id, user.id)
-    actions = db_get_warning_actions(guild.id)
-
-    if not actions:
-        return id
-
-    for action in actions:
-        if len(warnings) == action['Warnings']:  # only apply if the number of warnings matches, not if below
-            if action['Action'] == 'kick':
-                # try dm user
-                try:
-                    await user.send(
-                        trl(user.id, guild.id, "warn_actions_auto_kick_dm").format(name=guild.name,
-                                                                                   warnings=action['Warnings']))
-                except Exception:
-                    pass
-                await user.kick(
-                    reason=trl(user.id, guild.id, "warn_actions_auto_kick_reason").format(warnings=action['Warnings']))
-            elif action['Action'] == 'ban':
-                # try dm user
-                try:
-                    await user.send(
-                        trl(user.id, guild.id, "warn_actions_auto_ban_dm").format(name=guild.name,
-                                                                                  warnings=action['Warnings']))
-                except Exception:
-                    pass
-                await user.ban(
-                    reason=trl(user.id, guild.id, "warn_actions_auto_ban_reason").format(warnings=action['Warnings']))
-            elif action['Action'].startswith('timeout'):
-                time = action['Action'].split(' ')[1]
-                total_seconds = 0
-                if time == '12h':
-                    total_seconds = 43200
-                elif time == '1d':
-                    total_seconds = 86400
-                elif time == '7d':
-                    total_seconds = 604800
-                elif time == '28d':
-                    total_seconds = 2419200
-
-                # try dm
-                try:
-                    await user.send(
-                        trl(user.id, guild.id, "warn_actions_auto_timeout_dm").format(name=guild.name,
-                                                                                      warnings=action['Warnings'],
-                                                                                      time=pretty_time_delta(
-                                                                                          total_seconds,
-                                                                                          user_id=user.id,
-                                                                                          server_id=guild.id)))
-                except Exception:
-                    pass
-
-                await user.timeout_for(datetime.timedelta(seconds=total_seconds),
-                                       reason=trl(user.id, guild.id, "warn_actions_auto_timeout_reason").format(
-                                           warnings=action['Warnings']))
+    # only apply if the number of warnings matches, not if below
+    for action in (await get_warning_ladder_async(guild.id)).get(warning_count, []):
+        if action['Action'] == 'kick':
+            # try dm user
+            try:
+                await user.send(
+                    trl(user.id, guild.id, "warn_actions_auto_kick_dm").format(name=guild.name,
+                                                                               warnings=action['Warnings']))
+            except Exception:
+                pass
+            await user.kick(
+                reason=trl(user.id, guild.id, "warn_actions_auto_kick_reason").format(warnings=action['Warnings']))
+        elif action['Action'] == 'ban':
+            # try dm user
+            try:
+                await user.send(
+                    trl(user.id, guild.id, "warn_actions_auto_ban_dm").format(name=guild.name,
+                                                                              warnings=action['Warnings']))
+            except Exception:
+                pass
+            await user.ban(
+                reason=trl(user.id, guild.id, "warn_actions_auto_ban_reason").format(warnings=action['Warnings']))
+        elif action['Action'].startswith('timeout'):
+            time = action['Action'].split(' ')[1]
+            total_seconds = 0
+            if time == '12h':
+                total_seconds = 43200
+            elif time == '1d':
+                total_seconds = 86400
+            elif time == '7d':
+                total_seconds = 604800
+            elif time == '28d':
+                total_seconds = 2419200
+
+            # try dm
+            try:
+                await user.send(
+                    trl(user.id, guild.id, "warn_actions_auto_timeout_dm").format(name=guild.name,
+                                                                                  warnings=action['Warnings'],
+                                                                                  time=pretty_time_delta(
+                                                                                      total_seconds,
+                                                                                      user_id=user.id,
+                                                                                      server_id=guild.id)))
+            except Exception:
+                pass
+
+            await user.timeout_for(datetime.timedelta(seconds=total_seconds),
+                                   reason=trl(user.id, guild.id, "warn_actions_auto_timeout_reason").format(
+                                       warnings=action['Warnings']))
 
     return id
 
 
-def db_add_warning(guild_id: int, user_id: int, reason: str) -> ObjectId:
-    res = client['Warnings'].insert_one(
-        {'GuildID': str(guild_id), 'UserID': str(user_id), 'Reason': reason, 'Timestamp': get_date_time_str(guild_id)})
+def db_add_warning(guild_id: int, user_id: int, reason: str, expires_at: datetime.datetime | None = None) -> ObjectId:
+    warning = {'GuildID': str(guild_id), 'UserID': str(user_id), 'Reason': reason,
+               'Timestamp': get_date_time_str(guild_id)}
+    if expires_at is not None:
+        warning['ExpiresAt'] = expires_at
+
+    res = client['Warnings'].insert_one(warning)
     return res.inserted_id
 
 
+async def db_add_warning_async(guild_id: int, user_id: int, reason: str,
+                               expires_at: datetime.datetime | None = None) -> ObjectId:
+    warning = {'GuildID': str(guild_id), 'UserID': str(user_id), 'Reason': reason,
+               'Timestamp': get_date_time_str(guild_id)}
+    if expires_at is not None:
+        warning['ExpiresAt'] = expires_at
+
+    res = await async_client['Warnings'].insert_one(warning)
+    return res.inserted_id
+
+
+async def db_increment_warning_count_async(guild_id: int, user_id: int,
+                                           expires_at: datetime.datetime | None = None) -> int:
+    """Count a new warning for a user. Must be called after the warning was inserted.
+    The counter keeps the earliest expiry of the warnings it counts in NextExpiry. Once that has passed, the counter is
+    rebuilt from the warnings that are still active.
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+        expires_at (datetime.datetime | None): When the new warning expires, None if it doesn't
+
+    Returns:
+        int: Number of active warnings the user has now, including the new one
+    """
+    query = {'GuildID': str(guild_id), 'UserID': str(user_id)}
+    update = {'$inc': {'Count': 1}}
+    if expires_at is not None:
+        update['$min'] = {'NextExpiry': expires_at}
+
+    counter = await async_client['WarningCounts'].find_one_and_update(
+        {**query, '$or': [{'NextExpiry': None}, {'NextExpiry': {'$gt': datetime.datetime.now(datetime.UTC)}}]},
+        update, return_document=ReturnDocument.AFTER)
+    if counter:
+        return counter['Count']
+
+    # No counter yet, or some of the counted warnings expired. The new warning is already in the collection.
+    active = active_warnings_query(guild_id, user_id)
+    count = await async_client['Warnings'].count_documents(active)
+    next_warning = await async_client['Warnings'].find_one({**active, 'ExpiresAt': {'$ne': None}},
+                                                           sort=[('ExpiresAt', ASCENDING)])
+    recount = {'$set': {'Count': count, 'NextExpiry': next_warning['ExpiresAt'] if next_warning else None}}
+    try:
+        await async_client['WarningCounts'].update_one(query, recount, upsert=True)
+    except DuplicateKeyError:
+        # Another warning created the counter at the same time, the recount is just as valid for it
+        await async_client['WarningCounts'].update_one(query, recount)
+
+    return count
+
+
 def db_get_warnings(guild_id: int, user_id: int) -> list[dict]:
-    res = client['Warnings'].find({'GuildID': str(guild_id), 'UserID': str(user_id)}).to_list()
+    res = client['Warnings'].find(active_warnings_query(guild_id, user_id)).to_list()
     return res
 
 
-def db_remove_warning(guild_id: int, warning_id: str):
+async def db_get_warnings_async(guild_id: int, user_id: int) -> list[dict]:
+    res = await async_client['Warnings'].find(active_warnings_query(guild_id, user_id)).to_list()
+    return res
+
+
+def db_get_warnings_page(guild_id: int, user_id: int, after_id: ObjectId | None = None, limit: int = 10) -> list[dict]:
+    """Get a page of active warnings, oldest first
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+        after_id (ObjectId | None): ID of the last warning on the previous page, None for the first page
+        limit (int): Maximum number of warnings on the page
+
+    Returns:
+        list[dict]: Warnings
+    """
+    query = active_warnings_query(guild_id, user_id)
+    if after_id is not None:
+        query['_id'] = {'$gt': after_id}
+
+    return client['Warnings'].find(query).sort('_id', ASCENDING).limit(limit).to_list()
+
+
+def db_remove_warning(guild_id: int, user_id: int, warning_id: str) -> bool:
+    """Remove a warning from a user
+
+    Args:
+        guild_id (int): Guild ID
+        user_id (int): User ID
+        warning_id (str): Warning ID
+
+    Returns:
+        bool: Whether the warning existed and hadn't expired
+    """
     if not ObjectId.is_valid(warning_id):
-        return
+        return False
 
-    client['Warnings'].delete_one({'GuildID': str(guild_id), '_id': ObjectId(warning_id)})
+    res = client['Warnings'].delete_one({**active_warnings_query(guild_id, user_id), '_id': ObjectId(warning_id)})
+    if res.deleted_count != 1:
+        return False
+
+    client['WarningCounts'].update_one({'GuildID': str(guild_id), 'UserID': str(user_id), 'Count': {'$gt': 0}},
+                                       {'$inc': {'Count': -1}})
+    return True
 
 
 def db_add_warning_action(guild_id: int, action: str, warnings: int):
     client['WarningActions'].insert_one({'GuildID': str(guild_id), 'Action': action, 'Warnings': warnings})
+    warning_ladders.invalidate(guild_id)
 
 
 def db_get_warning_actions(guild_id: int) -> list[dict]:
@@ -130,7 +257,45 @@ def db_get_warning_actions(guild_id: int) -> list[dict]:
     return res
 
 
-def db_remove_warning_action(id: str):
+async def db_get_warning_actions_async(guild_id: int) -> list[dict]:
+    res = await async_client['WarningActions'].find({'GuildID': str(guild_id)}).to_list()
+    return res
+
+
+async def get_warning_ladder_async(guild_id: int) -> dict[int, list[dict]]:
+    """Get the warning actions of a guild indexed by the number of warnings they apply at
+
+    Args:
+        guild_id (int): Guild ID
+
+    Returns:
+        dict[int, list[dict]]: Warning count -> actions
+    """
+    ladder = warning_ladders.get(guild_id)
+    if ladder is not None:
+        return ladder
+
+    ladder = {}
+    for action in await db_get_warning_actions_async(guild_id):
+        ladder.setdefault(action['Warnings'], []).append(action)
+
+    warning_ladders.set(guild_id, ladder)
+    return ladder
+
+
+def db_remove_warning_action(guild_id: int, id: str) -> bool:
+    """Remove a warning action
+
+    Args:
+        guild_id (int): Guild ID
+        id (str): Warning action ID
+
+    Returns:
+        bool: Whether the warning action existed
+    """
     if not ObjectId.is_valid(id):
-        return
-    client['WarningActions'].delete_one({'_id': id})
+        return False
+
+    res = client['WarningActions'].delete_one({'GuildID': str(guild_id), '_id': ObjectId(id)})
+    warning_ladders.invalidate(guild_id)
+    return res.deleted_count == 1